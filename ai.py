@@ -1,9 +1,14 @@
-import google.generativeai as genai
 from fastapi import HTTPException
 import os
+import threading
 
-genai.configure(api_key=os.getenv('GEMINI_API_KEY')) 
-model = genai.GenerativeModel('gemini-1.5-flash')
+from metrics import span
+from report_cache import canonical_json
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+
+_model = None
+_model_lock = threading.Lock()
 
 
 global_context = """
@@ -19,21 +24,60 @@ Make sure to provide all important details of input json properly
 Ensure no placeholder text like "[Insert...]" appears. Use exact values from the data.
 ### Input JSON:
 """
-models = genai.list_models()
-for model in models:
-    print(model.name, model.supported_generation_methods)
 
-def get_summary(data:str):
-    """Fetch a summary from Gemini API"""
+narrative_context = """
+Write the executive summary of a sustainability assessment report for the following site data: one paragraph of 3 to 5 sentences, in a professional tone, covering solar, wind, water harvesting and afforestation feasibility.
+Use exact values from the data. Plain text only: no headings, lists, tables or placeholder text.
+### Input JSON:
+"""
+
+def get_model():
+    """Configures the Gemini client on first use and returns the summary model.
+
+    google.generativeai is heavy to import, so it is not loaded until the
+    first summary (or /ready) needs it.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+                _model = genai.GenerativeModel(GEMINI_MODEL)
+    return _model
+
+def build_prompt(data, context: str = global_context) -> str:
+    # Canonical JSON keeps the prompt identical for identical data
+    if not isinstance(data, str):
+        data = canonical_json(data)
+    print("data = ", data)
+    return f"{context}\n{data}"
+
+def get_summary(data):
+    """Fetch a summary from Gemini API for the assessment data (dict, or an already serialized str)"""
+    try:
+        with span("gemini_summary"):
+            response = get_model().generate_content(build_prompt(data))
+            return response.text
+    except Exception as e:
+         raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
+
+def get_narrative(data):
+    """Executive summary paragraph from Gemini, for the templated report (report_template.py)"""
     try:
-        global global_context
-        prompt = f"{global_context}\n{data}"
-        models = genai.list_models()
-        print("data = ", data)
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        response = model.generate_content(prompt)
-        return response.text
+        with span("gemini_narrative"):
+            response = get_model().generate_content(build_prompt(data, narrative_context))
+            return response.text.strip()
     except Exception as e:
          raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
 
-        
+def stream_summary(data):
+    """Like get_summary, but yields the Markdown in chunks as Gemini generates it"""
+    try:
+        with span("gemini_stream"):
+            response = get_model().generate_content(build_prompt(data), stream=True)
+            for chunk in response:
+                yield chunk.text
+    except Exception as e:
+         raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
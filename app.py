@@ -1,28 +1,53 @@
 import os
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, Query
-
-from solar import predict_solar, SolarInput
-from wind import (
-    fetch_nasa_wind_data,
-    fetch_osm_landuse,
-    fetch_osm_infrastructure,
-    fetch_existing_wind_turbines
+from fastapi import Body, FastAPI, HTTPException, Query
+
+from solar import (
+    predict_solar_batch,
+    random_forest,
+    SolarInput,
+    SolarBatchInput,
+    SOLAR_ENGINE,
+    load_global_model
+)
+import cache
+import executors
+import metrics
+import upstream
+from ai import get_model
+from earthengine import get_ee
+from pdf import warm_pool
+from executors import PoolSaturated
+from orchestrator import (
+    Site,
+    run_blocking,
+    run_assessments,
+    run_solar,
+    assess_wind,
+    assess_water,
+    assess_green
 )
-from soil import calculate_water_harvesting_score, calculate_afforestation_feasibility
 
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.staticfiles import StaticFiles
-import markdown
-from weasyprint import HTML
-import uuid
+import time
 import uvicorn
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SOLAR_ENGINE == "global":
+        # Load once so no request pays for unpickling the model
+        load_global_model()
+    yield
+    upstream.close()
+    executors.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 os.makedirs("static/pdfs", exist_ok=True)
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -39,6 +64,9 @@ allowed_ips = [
     "http://localhost:3000"
 ]
 
+# Stage timings of each request go out as a Server-Timing header
+app.add_middleware(metrics.TimingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_ips,
@@ -51,26 +79,79 @@ app.add_middleware(
 async def root():
     return {"message": "Welcome to the Solar Energy API"}
 
+# Clients and libraries that load lazily on first use; /ready loads them all
+WARMUPS = {
+    "earthengine": get_ee,
+    "gemini": get_model,
+    "weasyprint": warm_pool,
+    "sklearn": random_forest,
+}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: initializes every lazily loaded dependency, 503 if any fails."""
+    components = {}
+    for name, warm in WARMUPS.items():
+        start = time.perf_counter()
+        try:
+            warm()
+            components[name] = {"ready": True}
+        except Exception as e:
+            components[name] = {"ready": False, "error": str(e)}
+        components[name]["seconds"] = round(time.perf_counter() - start, 3)
+
+    is_ready = all(component["ready"] for component in components.values())
+    return JSONResponse({"ready": is_ready, "components": components}, status_code=200 if is_ready else 503)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus exposition of stage/request latency histograms and cache hit ratios."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Size, budget and hit/miss/eviction counters of every in-process cache namespace."""
+    return cache.stats()
+
+
 class LocationRequest(BaseModel):
     latitude: float
     longitude: float
 
 
+# Blocking work runs on the pools in executors.py; a saturated pool answers 429
+@app.exception_handler(PoolSaturated)
+async def pool_saturated(request, exc: PoolSaturated):
+    return JSONResponse({"detail": str(exc)}, status_code=429, headers={"Retry-After": "1"})
+
+
 # Solar
 @app.post("/check_solar_farm")
-def check_solar_farm(input_data: SolarInput):
+async def check_solar_farm(input_data: SolarInput):
     f""" Predicted Solar Energy Potential
         Unit of "value" is kWh/m²
     """
-    return predict_solar(input_data)
+    return await run_solar(input_data)
+
+
+@app.post("/check_solar_farm_batch")
+async def check_solar_farm_batch(input_data: SolarBatchInput):
+    """ Predicted Solar Energy Potential for many locations and months
+        Columnar response: one entry per location x month, "value" in kWh/m²
+    """
+    try:
+        return await run_blocking(predict_solar_batch, input_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 
 @app.post("/check_water_harvesting_score")
-def check_water_harvesting_score(location: LocationRequest):
-    latitude = location.latitude
-    longitude = location.longitude
-    return calculate_water_harvesting_score(latitude, longitude)
+async def check_water_harvesting_score(location: LocationRequest):
+    return await assess_water(Site(location.latitude, location.longitude))
 
 
 
@@ -84,196 +165,96 @@ def check_water_harvesting_score(location: LocationRequest):
 
 
 @app.post("/check_wind_farm")
-def check_wind_farm(location: LocationRequest):
-    latitude = location.latitude
-    longitude = location.longitude
-    
-    wind_df = fetch_nasa_wind_data(latitude, longitude)
-    if wind_df is None:
-        return {"status": "error", "message": "Failed to fetch wind data"}
-
-    avg_wind_speed = wind_df['WindSpeed'].mean()
-
-    land_use_types = fetch_osm_landuse(latitude, longitude)
-    
-    infra_count = fetch_osm_infrastructure(latitude, longitude)
-    
-    wind_turbines = fetch_existing_wind_turbines(latitude, longitude)
-
-    if wind_turbines and wind_turbines > 0:
-        return {
-            "status": "exists",
-            "message": f"Wind farm already exists with {wind_turbines} turbines."
-        }
-
-    if avg_wind_speed < 3.5:
-        return {
-            "status": "Not Feasible",
-            "message": "Wind speed too low for a wind farm.",
-            "avg_wind_speed": avg_wind_speed
-        }
+async def check_wind_farm(location: LocationRequest):
+    # POWER series and Overpass context are fetched concurrently
+    return await assess_wind(Site(location.latitude, location.longitude))
 
-    unsuitable_land = {"residential", "industrial", "urban"}
-    if land_use_types and land_use_types.intersection(unsuitable_land):
-        return {
-            "status": "Not Feasible",
-            "message": f"Land is {land_use_types} → Not suitable for wind farms."
-        }
 
-    if infra_count is None or infra_count < 5:
-        return {
-            "status": "Not Feasible",
-            "message": "No roads or power grid nearby → Wind farm not feasible."
-        }
 
-    turbine_type = "VAWT (Vertical Axis Wind Turbine)" if avg_wind_speed < 6.5 else "HAWT (Horizontal Axis Wind Turbine)"
-
-    return {
-        "status": "feasible",
-        "message": "Wind farm feasible!",
-        "avg_wind_speed": f"{round(avg_wind_speed, 2)} m/s",
-        "recommended_turbine": turbine_type
-    }
-
-
-
-
-
-
-# def generate_pdf(md_content: str) -> str:
-#     """Converts Markdown content (response from LLM) to PDF and saves it on the server."""
-    
-#     html_content = markdown.markdown(md_content)
-    
-#     pdf_filename = f"static/pdfs/summary_{uuid.uuid4().hex}.pdf"
-    
-#     html = HTML(string=html_content)
-#     html.write_pdf(pdf_filename)
-    
-#     return pdf_filename
-
-
-import markdown2
-
-
-def generate_pdf(md_content: str) -> str:
-    """Converts Markdown content to PDF and saves it locally."""
-    
-    # Convert markdown to HTML using markdown2 with table extras
-    html_content = markdown2.markdown(md_content, extras=["tables"])
-    
-    # Define more robust CSS for better table styling
-    custom_css = """
-    body {
-        font-family: Arial, sans-serif;
-        margin: 20px;
-        line-height: 1.6;
-    }
-    h2, h3 {
-        color: #333;
-    }
-    table {
-        width: 100%;
-        border-collapse: collapse;
-        margin: 20px 0;
-        page-break-inside: avoid;
-    }
-    th, td {
-        border: 1px solid #ddd;
-        padding: 8px 12px;
-        text-align: left;
-        vertical-align: top;
-    }
-    th {
-        background-color: #f4f4f4;
-        font-weight: bold;
-    }
-    tr:nth-child(even) {
-        background-color: #f9f9f9;
-    }
-    /* Ensure tables don't overflow page width */
-    table {
-        word-wrap: break-word;
-        table-layout: fixed;
-    }
-    /* Add some spacing between sections */
-    h2 {
-        margin-top: 30px;
-    }
-    """
 
-    # Create a more robust HTML structure
-    html_with_css = f"""
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Sustainability Report</title>
-            <style>
-                {custom_css}
-            </style>
-        </head>
-        <body>
-            <div class="content">
-                {html_content}
-            </div>
-        </body>
-    </html>
-    """
-    
-    # Create a unique PDF filename using UUID
-    pdf_filename = f"static/pdfs/summary_{uuid.uuid4().hex}.pdf"
-    
-    # Generate the PDF with additional weasyprint options for better rendering
-    html = HTML(string=html_with_css)
-    html.write_pdf(
-        pdf_filename,
-        stylesheets=None,
-        presentational_hints=True  # Helps with some table rendering
-    )
-    
-    return pdf_filename
 
 
 @app.post("/check_green")
-def check_green(location: LocationRequest):
-    latitude = location.latitude
-    longitude = location.longitude
-    return calculate_afforestation_feasibility(latitude, longitude)
+async def check_green(location: LocationRequest):
+    return await assess_green(Site(location.latitude, location.longitude))
 
 
-from ai import get_summary
+from reports import submit_report, get_report_job, report_events, report_pool, stream_report
+from screening import ScreeningRequest, plan_sites, screen_sites, screening_pool
 
 
 
 @app.post("/getall")
-def get_all(location: LocationRequest):
+async def get_all(location: LocationRequest):
     try:
-        solar_input = SolarInput(latitude= location.latitude, longitude= location.longitude)
+        assessments = await run_assessments(location.latitude, location.longitude)
         data = {
             "latitude": location.latitude,
             "longitude": location.longitude,
-            "solar": check_solar_farm(solar_input),
-            "wind": check_wind_farm(location),
-            "water": check_water_harvesting_score(location),
-            "green": check_green(location)
+            **assessments
         }
 
-        str_data = str(data)
-        summary = get_summary(str_data)
-
-        pdf_file_path = generate_pdf(summary)
+        # Summary and PDF are produced in the background; poll or subscribe for the link.
+        # Creating the job touches the job and PDF files, so it runs off the event loop.
+        job_id = await run_blocking(submit_report, data)
 
-        summary_link = f"static/pdfs/{os.path.basename(pdf_file_path)}"
-        
         return {
             "data": data,
-            "summary_link": summary_link,
-            # "summary": summary
+            "report_job_id": job_id,
+            "report_status_url": f"/reports/{job_id}",
+            "report_events_url": f"/reports/{job_id}/events",
         }
+    except PoolSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Keep proxies from buffering event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@app.get("/reports/{job_id}")
+def get_report(job_id: str):
+    job = get_report_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    return job
+
+
+@app.get("/reports/{job_id}/events")
+async def get_report_events(job_id: str):
+    """Server-Sent Events stream of the report job's status until it is done or failed."""
+    if get_report_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown report job")
+    return StreamingResponse(report_events(job_id), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/summary/stream")
+async def summary_stream(data: dict = Body(...)):
+    """Server-Sent Events stream of the summary for assessment data (the "data" of /getall).
+    'chunk' events carry Markdown as Gemini generates it; the PDF is rendered
+    afterwards and reported by 'status' events like /reports/{job_id}/events.
+    When /getall has already started the report, the stream follows that job.
+    """
+    # Refuse up front while report jobs are backed up; a 429 can't be sent mid-stream
+    report_pool.check()
+    return StreamingResponse(stream_report(data), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/screen")
+async def screen(request: ScreeningRequest):
+    """Bulk site screening over a coordinate list or a bbox grid.
+    Streams one NDJSON line per unique site as soon as its checks complete.
+    """
+    try:
+        sites = plan_sites(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Refuse up front while screening work is backed up; a 429 can't be sent mid-stream
+    screening_pool.check()
+    return StreamingResponse(screen_sites(sites), media_type="application/x-ndjson")
+
+
 # if __name__ == "__main__":
 #     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,280 @@
+"""Offline benchmark suite for the assessment pipeline.
+
+Upstream APIs are replaced by fixtures (see fixtures.py) and the stand-in
+`ee` and `google.generativeai` modules in benchmarks/stubs, so runs need no
+network or credentials and are repeatable. Every benchmark runs at each
+concurrency level; results are compared against a stored baseline
+(baseline.json). Timings depend on the machine, so save a baseline on the
+machine that runs the comparisons.
+
+    python benchmarks/bench.py                        # all benchmarks, concurrency 1 4 16
+    python benchmarks/bench.py --only predict_solar_warm check_wind_farm -c 1 8
+    python benchmarks/bench.py --save-baseline        # store this run as the baseline
+
+Simulated latencies: BENCH_POWER_LATENCY, BENCH_OVERPASS_LATENCY,
+BENCH_EE_LATENCY, BENCH_LLM_LATENCY (seconds). The run happens in a
+temporary directory, so caches and trained models start empty.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# Sites near one another share a POWER grid cell (so its series comes from the
+# disk cache after the first call) but not Overpass / Earth Engine flights.
+BASE_LAT, BASE_LON = 12.97, 77.59
+SITE_STEP = 0.001
+CELL_STEP = 0.5  # One POWER cell per cold solar prediction
+
+
+def site(i: int):
+    return round(BASE_LAT + SITE_STEP * (i % 100), 6), round(BASE_LON + SITE_STEP * (i // 100), 6)
+
+
+def _percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(latencies, wall: float, errors: int, concurrency: int) -> dict:
+    """Latency stats cover successful calls only, so failures (e.g. fast 429s) don't flatter them."""
+    result = {
+        "concurrency": concurrency,
+        "iterations": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 3),
+        "mean_ms": None,
+        "p50_ms": None,
+        "p95_ms": None,
+    }
+    if latencies:
+        result["mean_ms"] = round(statistics.mean(latencies) * 1000, 1)
+        result["p50_ms"] = round(_percentile(latencies, 0.5) * 1000, 1)
+        result["p95_ms"] = round(_percentile(latencies, 0.95) * 1000, 1)
+    return result
+
+
+def measure(call, concurrency: int, iterations: int) -> dict:
+    """Runs call(i) for i in range(iterations) on `concurrency` threads."""
+    latencies, errors = [], 0
+
+    def timed_call(i):
+        start = time.perf_counter()
+        try:
+            call(i)
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seconds, error in pool.map(timed_call, range(iterations)):
+            if error is None:
+                latencies.append(seconds)
+            else:
+                errors += 1
+                print(f"    error: {error!r}")
+    return summarize(latencies, time.perf_counter() - start, errors, concurrency)
+
+
+# One loop for every async benchmark: the app's module-level asyncio
+# primitives bind to the first loop that uses them, as under uvicorn
+_loop = asyncio.new_event_loop()
+
+
+def measure_async(call, concurrency: int, iterations: int) -> dict:
+    """Runs `await call(i)` for i in range(iterations), at most `concurrency` at a time."""
+    async def run():
+        slots = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def timed_call(i):
+            nonlocal errors
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    await call(i)
+                except Exception as e:
+                    errors += 1
+                    print(f"    error: {e!r}")
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed_call(i) for i in range(iterations)))
+        return summarize(latencies, time.perf_counter() - start, errors, concurrency)
+
+    return _loop.run_until_complete(run())
+
+
+def setup_environment(workdir: str):
+    """Points imports at the stubs and the repo, and runs from an empty working directory."""
+    sys.path[:0] = [os.path.join(BENCH_DIR, "stubs"), ROOT, BENCH_DIR]
+    os.chdir(workdir)
+    os.makedirs("static/pdfs", exist_ok=True)
+    os.environ.setdefault("SOLAR_ENGINE", "forest")
+    # Admit the highest concurrency level, so runs time the work rather than 429s
+    os.environ.setdefault("CPU_MAX_PENDING", "64")
+
+    import fixtures
+    import upstream
+
+    upstream.use_transport(fixtures.replay_transport())
+
+
+def benchmarks(iterations: int):
+    """{name: (runner, call, iterations for a concurrency level)}; imported after setup_environment."""
+    import httpx
+
+    import app
+    import solar
+    from pdf import generate_pdf
+    from soil import calculate_water_harvesting_score, calculate_afforestation_feasibility
+
+    with open(os.path.join(BENCH_DIR, "fixtures", "summary.md"), encoding="utf-8") as f:
+        summary = f.read()
+
+    def predict_solar_cold(i):
+        # A fresh grid cell every call: fetch, train and pickle a model
+        predict_solar_cold.calls += 1
+        lat = BASE_LAT + CELL_STEP * predict_solar_cold.calls
+        result = solar.predict_solar(solar.SolarInput(latitude=lat, longitude=BASE_LON))
+        if "value" not in result:
+            raise RuntimeError(result)
+    predict_solar_cold.calls = 0
+
+    def predict_solar_warm(i):
+        result = solar.predict_solar(solar.SolarInput(latitude=BASE_LAT, longitude=BASE_LON, month=1 + i % 12))
+        if "value" not in result:
+            raise RuntimeError(result)
+
+    async def check_wind_farm(i):
+        lat, lon = site(i)
+        result = await app.check_wind_farm(app.LocationRequest(latitude=lat, longitude=lon))
+        if result.get("status") == "error":
+            raise RuntimeError(result)
+
+    def water_harvesting(i):
+        calculate_water_harvesting_score(*site(i))
+
+    def afforestation(i):
+        result = calculate_afforestation_feasibility(*site(i))
+        if result["status"] != "success":
+            raise RuntimeError(result)
+
+    def render_pdf(i):
+        generate_pdf(summary, f"static/pdfs/bench_{i}.pdf")
+
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app), base_url="http://bench", timeout=None)
+
+    async def getall(i):
+        lat, lon = site(1000 + i)
+        response = await client.post("/getall", json={"latitude": lat, "longitude": lon})
+        response.raise_for_status()
+
+    # Warm the shared state the warm benchmarks assume
+    predict_solar_warm(0)
+
+    suite = {
+        "predict_solar_cold": (measure, predict_solar_cold, lambda c: max(c, 2)),
+        "predict_solar_warm": (measure, predict_solar_warm, lambda c: max(iterations, c)),
+        "check_wind_farm": (measure_async, check_wind_farm, lambda c: max(iterations // 4, c)),
+        "water_harvesting": (measure, water_harvesting, lambda c: max(iterations // 4, c)),
+        "afforestation": (measure, afforestation, lambda c: max(iterations // 4, c)),
+        "getall": (measure_async, getall, lambda c: max(iterations // 4, c)),
+    }
+    if importlib.util.find_spec("weasyprint") is not None:
+        suite["generate_pdf"] = (measure, render_pdf, lambda c: max(iterations // 4, c))
+    else:
+        print("weasyprint is not installed, skipping generate_pdf")
+    return suite
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Returns a list of regression descriptions.
+
+    A regression is more errors than the baseline, or p50 up or throughput
+    down by more than `tolerance`.
+    """
+    regressions = []
+    for name, levels in results.items():
+        for level, current in levels.items():
+            previous = baseline.get(name, {}).get(level)
+            if previous is None:
+                continue
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{name} @ {level}: errors {previous['errors']} -> {current['errors']}")
+            if current["p50_ms"] is not None and previous["p50_ms"] is not None and \
+                    current["p50_ms"] > previous["p50_ms"] * (1 + tolerance):
+                regressions.append(f"{name} @ {level}: p50 {previous['p50_ms']} -> {current['p50_ms']} ms")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name} @ {level}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks with recorded upstream fixtures")
+    parser.add_argument("--only", nargs="+", metavar="NAME")
+    parser.add_argument("-c", "--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("-n", "--iterations", type=int, default=64, help="Calls per level for the fast benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    setup_environment(workdir)
+    suite = benchmarks(args.iterations)
+    names = args.only or list(suite)
+
+    results = {}
+    try:
+        for name in names:
+            runner, call, iterations_for = suite[name]
+            results[name] = {}
+            for concurrency in args.concurrency:
+                result = runner(call, concurrency, iterations_for(concurrency))
+                results[name][str(concurrency)] = result
+                print(f"{name:<20} c={concurrency:<3} n={result['iterations']:<4} "
+                      f"{result['throughput_rps']:>9.2f} rps  p50 {result['p50_ms'] or 0:>9.1f} ms  "
+                      f"p95 {result['p95_ms'] or 0:>9.1f} ms  errors {result['errors']}")
+    finally:
+        import executors
+        import upstream
+        upstream.close()
+        executors.shutdown()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
@@ -0,0 +1,64 @@
+"""Cold-start import benchmark.
+
+Imports each module in a fresh interpreter (so nothing is already cached in
+sys.modules) and reports the median wall time, plus the slowest imports
+from `python -X importtime` for the app.
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["app", "solar", "wind", "soil", "ai", "pdf", "reports", "orchestrator"]
+
+
+def time_import(module: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def slowest_imports(module: str, top: int):
+    """(cumulative seconds, name) of the `top` slowest direct imports of `module`, from -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is two spaces per level; keep the direct imports of the
+        # module, deeper ones are already included in their parent's time
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the API modules")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports of app to list")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    # The interpreter alone, to subtract from the numbers below
+    baseline = statistics.median(time_import("sys") for _ in range(args.repeat))
+    print(f"{'interpreter':<14}{baseline * 1000:8.0f} ms")
+    for module in args.modules:
+        try:
+            times = [time_import(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError:
+            print(f"{module:<14}  import failed")
+            continue
+        print(f"{module:<14}{(statistics.median(times) - baseline) * 1000:8.0f} ms")
+
+    print("\nSlowest imports of app:")
+    for seconds, name in slowest_imports("app", args.top):
+        print(f"{seconds * 1000:8.0f} ms  {name}")
@@ -0,0 +1,186 @@
+"""Upstream fixtures for the offline benchmarks.
+
+NASA POWER (daily and monthly) and Overpass responses are served from JSON
+files in benchmarks/fixtures/ through an httpx.MockTransport installed with
+upstream.use_transport, with a simulated per-host latency.
+
+The files are either synthesized (deterministic, the default when they are
+missing) or recorded from the live APIs for one location. The POWER
+fixtures in the repository are synthesized with the default seed and
+gzipped; re-record them where the APIs are reachable:
+
+    python benchmarks/fixtures.py --synthesize
+    python benchmarks/fixtures.py --record 12.97 77.59
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+import numpy as np
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# POWER fixtures cover 1981-2024 daily for three parameters, so they are gzipped
+POWER_DAILY = "power_daily.json.gz"
+POWER_MONTHLY = "power_monthly.json.gz"
+OVERPASS = "overpass_wind_context.json"
+
+# Simulated round-trip time per upstream host, in seconds
+HOST_LATENCY = {
+    "power.larc.nasa.gov": float(os.getenv("BENCH_POWER_LATENCY", "0.3")),
+    "overpass-api.de": float(os.getenv("BENCH_OVERPASS_LATENCY", "0.5")),
+}
+
+
+def fixture_name(url: httpx.URL) -> str:
+    if url.host == "overpass-api.de":
+        return OVERPASS
+    return POWER_MONTHLY if "/monthly/" in url.path else POWER_DAILY
+
+
+def _path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, name)
+
+
+def _open(name: str, mode: str):
+    if name.endswith(".gz"):
+        # mtime=0 keeps regenerated files byte-identical
+        return gzip.GzipFile(_path(name), mode, mtime=0) if "w" in mode else gzip.open(_path(name), mode)
+    return open(_path(name), mode)
+
+
+def synthesize(seed: int = 42):
+    """Writes POWER fixtures with seasonal, noisy series (fixed seed) for 1981-2024."""
+    rng = np.random.default_rng(seed)
+    days = np.arange(np.datetime64("1981-01-01"), np.datetime64("2025-01-01"))
+    day_of_year = (days - days.astype("datetime64[Y]")).astype(int) + 1
+    season = np.cos(2 * np.pi * (day_of_year - 172) / 365.25)
+    keys = [str(day).replace("-", "") for day in days]
+
+    series = {
+        "ALLSKY_SFC_SW_DWN": np.clip(5.2 + 1.4 * season + rng.normal(0, 0.9, len(days)), 0.2, None),
+        "PRECTOTCORR": rng.gamma(0.6, 4.5, len(days)) * (rng.random(len(days)) < 0.45),
+        "WS10M": np.clip(4.6 + 1.1 * season + rng.normal(0, 1.2, len(days)), 0.1, None),
+    }
+    daily = {name: dict(zip(keys, np.round(values, 2).tolist())) for name, values in series.items()}
+
+    monthly = {}
+    rain = series["PRECTOTCORR"]
+    months = days.astype("datetime64[M]")
+    for year in range(1981, 2025):
+        in_year = days.astype("datetime64[Y]") == np.datetime64(str(year))
+        for month in range(1, 13):
+            in_month = months == np.datetime64(f"{year}-{month:02d}")
+            monthly[f"{year}{month:02d}"] = round(float(rain[in_month].mean()), 2)
+        monthly[f"{year}13"] = round(float(rain[in_year].mean()), 2)
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with _open(POWER_DAILY, "wb") as f:
+        f.write(json.dumps({"properties": {"parameter": daily}}).encode())
+    with _open(POWER_MONTHLY, "wb") as f:
+        f.write(json.dumps({"properties": {"parameter": {"PRECTOTCORR": monthly}}}).encode())
+
+
+def ensure_fixtures():
+    if not all(os.path.exists(_path(name)) for name in (POWER_DAILY, POWER_MONTHLY)):
+        print("Synthesizing POWER fixtures")
+        synthesize()
+
+
+def _load(name: str) -> dict:
+    with _open(name, "rb") as f:
+        return json.load(f)
+
+
+def replay_transport() -> httpx.MockTransport:
+    """MockTransport answering POWER and Overpass requests from the fixtures.
+
+    POWER responses are cut down to the requested parameters and date range,
+    like the real API.
+    """
+    ensure_fixtures()
+    fixtures = {name: _load(name) for name in (POWER_DAILY, POWER_MONTHLY, OVERPASS)}
+    bodies = {}
+
+    def power_body(name: str, params: httpx.QueryParams) -> bytes:
+        key = (name, params.get("parameters"), params.get("start"), params.get("end"))
+        if key not in bodies:
+            recorded = fixtures[name]["properties"]["parameter"]
+            start, end = str(params["start"]), str(params["end"])
+            selected = {}
+            for parameter in params["parameters"].split(","):
+                values = recorded[parameter]
+                selected[parameter] = {
+                    date: value for date, value in values.items() if start <= date[:len(start)] <= end
+                }
+            bodies[key] = json.dumps({"properties": {"parameter": selected}}).encode()
+        return bodies[key]
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(HOST_LATENCY.get(request.url.host, 0.0))
+        name = fixture_name(request.url)
+        if name == OVERPASS:
+            return httpx.Response(200, json=fixtures[OVERPASS])
+        return httpx.Response(200, content=power_body(name, request.url.params),
+                              headers={"content-type": "application/json"})
+
+    return httpx.MockTransport(handler)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to the network and keeps each fixture's response body."""
+
+    def __init__(self):
+        self.inner = httpx.AsyncHTTPTransport()
+        self.bodies = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        if response.status_code == 200:
+            self.bodies[fixture_name(request.url)] = body
+        # The body is already decoded, so drop the headers describing the wire format
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in ("content-encoding", "content-length")]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+
+def record(lat: float, lon: float):
+    """Records the POWER and Overpass responses the assessments make for (lat, lon)."""
+    sys.path.insert(0, ROOT)
+    os.environ["POWER_CACHE_DIR"] = tempfile.mkdtemp(prefix="power-record-")
+    import power
+    import upstream
+    import wind
+    from soil import RAINFALL_START_YEAR, RAINFALL_END_YEAR
+
+    recorder = RecordingTransport()
+    upstream.use_transport(recorder)
+    power.fetch_point(lat, lon)
+    power.fetch_monthly(lat, lon, "PRECTOTCORR", RAINFALL_START_YEAR, RAINFALL_END_YEAR)
+    wind.fetch_osm_wind_context(lat, lon)
+    upstream.close()
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for name, body in recorder.bodies.items():
+        with _open(name, "wb") as f:
+            f.write(body)
+        print(f"Recorded {name} ({len(body)} bytes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the upstream fixtures for the benchmarks")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--synthesize", action="store_true")
+    group.add_argument("--record", nargs=2, type=float, metavar=("LAT", "LON"))
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize()
+    else:
+        record(*args.record)
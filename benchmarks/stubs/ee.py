@@ -0,0 +1,35 @@
+"""Offline stand-in for the Earth Engine API used by the benchmarks.
+
+Every ee call builds a chainable expression; getInfo() sleeps for
+BENCH_EE_LATENCY seconds (the server round-trip) and returns the layer
+values fetch_site_layers expects. Only the single-site path is supported.
+"""
+import os
+import time
+
+EE_LATENCY = float(os.getenv("BENCH_EE_LATENCY", "0.5"))
+SITE_LAYERS = {"soil": 6.0, "slope": 3.2, "green": 0.31, "barren": 0.14}
+
+
+class _Expression:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Expression()
+
+    def __call__(self, *args, **kwargs):
+        return _Expression()
+
+    def getInfo(self):
+        time.sleep(EE_LATENCY)
+        return dict(SITE_LAYERS)
+
+
+def Initialize(*args, **kwargs):
+    pass
+
+
+def __getattr__(name):
+    # ee.Image, ee.Geometry, ee.Reducer, ee.Dictionary, ...
+    return _Expression()
@@ -0,0 +1,40 @@
+"""Offline stand-in for google.generativeai used by the benchmarks.
+
+generate_content sleeps for BENCH_LLM_LATENCY seconds and returns a fixed
+Markdown report (benchmarks/fixtures/summary.md); with stream=True the
+report arrives in BENCH_LLM_CHUNKS pieces spread over that time.
+"""
+import os
+import time
+
+LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "2.0"))
+LLM_CHUNKS = int(os.getenv("BENCH_LLM_CHUNKS", "20"))
+SUMMARY_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "fixtures", "summary.md")
+
+
+def configure(**kwargs):
+    pass
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class GenerativeModel:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False):
+        with open(SUMMARY_PATH, encoding="utf-8") as f:
+            summary = f.read()
+        if not stream:
+            time.sleep(LLM_LATENCY)
+            return _Response(summary)
+        return self._stream(summary)
+
+    def _stream(self, summary: str):
+        size = -(-len(summary) // LLM_CHUNKS)
+        for start in range(0, len(summary), size):
+            time.sleep(LLM_LATENCY / LLM_CHUNKS)
+            yield _Response(summary[start:start + size])
@@ -0,0 +1,138 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+# Bounded in-process caches shared by all modules. Each namespace has its own
+# byte budget (entries are weighted by their estimated size) and optional
+# TTL; inserting past the budget evicts least recently used entries.
+# Budgets and TTLs can be overridden per namespace with
+# CACHE_<NAMESPACE>_MB and CACHE_<NAMESPACE>_TTL (seconds), where NAMESPACE is
+# upper-cased with dashes as underscores, e.g. CACHE_SOLAR_MODEL_MB=512.
+MB = 1024 * 1024
+
+_caches: Dict[str, "BoundedCache"] = {}
+_registry_lock = threading.Lock()
+
+
+def sizeof(value) -> int:
+    """Estimated memory footprint of a cached value in bytes."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "memory_usage"):  # pandas DataFrame / Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    if isinstance(value, (int, float, bool, type(None))):
+        return sys.getsizeof(value)
+    # Models and other objects: their pickled size tracks their memory well enough
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class BoundedCache:
+    """Thread-safe LRU cache limited by the total estimated size of its values."""
+
+    def __init__(self, name: str, max_bytes: int, ttl: Optional[float] = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.rejections = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value, size: Optional[int] = None):
+        """Stores `value`, evicting LRU entries to fit; values larger than the whole budget are not kept."""
+        if size is None:
+            size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self.rejections += 1
+                return
+            while self._bytes + size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._drop(key)
+            return entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejections": self.rejections,
+            }
+
+
+def namespace(name: str, max_mb: float, ttl: Optional[float] = None) -> BoundedCache:
+    """Returns the shared cache for `name`, creating it with the given defaults on first use."""
+    with _registry_lock:
+        if name not in _caches:
+            env_name = name.upper().replace("-", "_")
+            max_mb = float(os.getenv(f"CACHE_{env_name}_MB", max_mb))
+            ttl_env = os.getenv(f"CACHE_{env_name}_TTL")
+            if ttl_env is not None:
+                ttl = float(ttl_env) or None
+            _caches[name] = BoundedCache(name, int(max_mb * MB), ttl)
+        return _caches[name]
+
+
+def stats() -> Dict[str, dict]:
+    """Per-namespace sizes and hit/miss/eviction counters."""
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,23 @@
+import os
+import threading
+
+# Earth Engine is imported and initialized on first use rather than at import
+# time: ee.Initialize makes network calls, so doing it on import slowed every
+# worker start and failed outright without connectivity.
+EE_PROJECT = os.getenv("EE_PROJECT", "ecstatic-spirit-455219-c2")
+
+_ee = None
+_init_lock = threading.Lock()
+
+
+def get_ee():
+    """Returns the `ee` module, initializing it for EE_PROJECT on the first call."""
+    global _ee
+    if _ee is None:
+        with _init_lock:
+            if _ee is None:
+                import ee
+
+                ee.Initialize(project=EE_PROJECT)
+                _ee = ee
+    return _ee
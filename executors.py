@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from prometheus_client import Counter, Gauge
+
+# Dedicated pools, so a burst of one kind of work can't starve the others:
+#   io  - threads for blocking upstream fetches (POWER, Overpass, Earth Engine)
+#   cpu - processes for GIL-bound work (RandomForest training)
+#   llm - a few threads for Gemini calls, which mostly wait on the network
+# PDF rendering has its own warm process pool in pdf.py.
+# Each pool admits at most *_MAX_PENDING running + queued tasks; past that
+# submit raises PoolSaturated, which the API turns into a 429.
+IO_WORKERS = int(os.getenv("IO_WORKERS", "32"))
+IO_MAX_PENDING = int(os.getenv("IO_MAX_PENDING", "256"))
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+CPU_MAX_PENDING = int(os.getenv("CPU_MAX_PENDING", str(4 * CPU_WORKERS)))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "4"))
+LLM_MAX_PENDING = int(os.getenv("LLM_MAX_PENDING", "16"))
+
+POOL_PENDING = Gauge("executor_pending_tasks", "Running + queued tasks per pool", ["pool"])
+POOL_REJECTED = Counter("executor_rejected_total", "Tasks refused because the pool was saturated", ["pool"])
+
+# Every BoundedExecutor, so shutdown() also stops pools defined in other modules
+_pools = []
+
+
+class PoolSaturated(Exception):
+    def __init__(self, pool: str, limit: int):
+        super().__init__(f"The {pool} pool is saturated (limit of {limit} pending tasks), retry later")
+        self.pool = pool
+
+
+class BoundedExecutor:
+    """Wraps an executor with a cap on pending tasks.
+
+    Thread pools run tasks in a copy of the caller's context (so metrics
+    spans reach the request); process pools can't carry context over.
+    A process pool is unusable for good once a worker dies (OOM kill, crash,
+    failed initializer); with a `factory` it is replaced by a new one.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_pending: int,
+                 factory: Optional[Callable[[], Executor]] = None):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self._factory = factory
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._copy_context = isinstance(executor, ThreadPoolExecutor)
+        _pools.append(self)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def check(self):
+        """Raises PoolSaturated if a submit would be refused now; for callers that submit later."""
+        if self._pending >= self.max_pending:
+            POOL_REJECTED.labels(self.name).inc()
+            raise PoolSaturated(self.name, self.max_pending)
+
+    def submit(self, func, *args) -> Future:
+        with self._lock:
+            self.check()
+            self._pending += 1
+            POOL_PENDING.labels(self.name).set(self._pending)
+
+        if self._copy_context:
+            func = functools.partial(contextvars.copy_context().run, func)
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(func, *args)
+            except BrokenProcessPool:
+                # Broken by an earlier task whose worker died
+                executor = self._replace(executor)
+                future = executor.submit(func, *args)
+        except BaseException:
+            self._done(None, None)
+            raise
+        future.add_done_callback(functools.partial(self._done, executor))
+        return future
+
+    def _done(self, executor, future):
+        with self._lock:
+            self._pending -= 1
+            POOL_PENDING.labels(self.name).set(self._pending)
+        if future is not None and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace(executor)
+
+    def _replace(self, broken: Executor) -> Executor:
+        """Swaps a broken pool for a new one, once however many tasks saw it break."""
+        with self._lock:
+            replaced = self.executor is broken and self._factory is not None
+            if replaced:
+                print(f"The {self.name} pool is broken (a worker process died), starting a new one")
+                self.executor = self._factory()
+            executor = self.executor
+        # Outside the lock: cancelling queued futures runs their _done callbacks inline
+        if replaced:
+            broken.shutdown(wait=False, cancel_futures=True)
+        return executor
+
+    def shutdown(self):
+        with self._lock:
+            self._factory = None  # A task failing during shutdown must not start a new pool
+            executor = self.executor
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def call(self, func, *args):
+        """Runs func(*args) on the pool and blocks until it returns; for worker threads."""
+        return self.submit(func, *args).result()
+
+    async def run(self, func, *args):
+        """Runs func(*args) on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+
+def process_pool(workers: int, initializer=None) -> ProcessPoolExecutor:
+    # Spawned rather than forked: the parent runs threads (HTTP loop, pools) whose
+    # locks a forked child could inherit in a held state
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=initializer
+    )
+
+
+def bounded_process_pool(name: str, workers: int, max_pending: int, initializer=None) -> BoundedExecutor:
+    """A BoundedExecutor over process_pool() that starts a new pool when the current one breaks."""
+    factory = functools.partial(process_pool, workers, initializer)
+    return BoundedExecutor(name, factory(), max_pending, factory=factory)
+
+
+io = BoundedExecutor("io", ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io"), IO_MAX_PENDING)
+cpu = bounded_process_pool("cpu", CPU_WORKERS, CPU_MAX_PENDING)
+llm = BoundedExecutor("llm", ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm"), LLM_MAX_PENDING)
+
+
+def shutdown():
+    for pool in _pools:
+        pool.shutdown()
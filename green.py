@@ -1,9 +1,7 @@
-import ee
-
-# Initialize GEE (Replace with your GEE Project ID)
-ee.Initialize(project='ecstatic-spirit-455219-c2')
+from earthengine import get_ee
 
 def afforestation_feasibility(lat, lon):
+    ee = get_ee()
     print("\n🌿 Fetching Sentinel-2 Land Cover Data (Updated)...")
 
     # Radius of 5 km (5000 meters)
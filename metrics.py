@@ -0,0 +1,143 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+import cache
+
+# Latency instrumentation. span("stage") times a block of code into the
+# stage_duration_seconds histogram and, during an HTTP request, into the
+# request's Server-Timing header. Upstream calls, Earth Engine, model
+# training, Gemini and PDF rendering are all wrapped, so /metrics shows where
+# a slow /getall spends its time. Metrics are per worker process.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "stage_duration_seconds", "Time spent in each fetch/compute stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, including streamed bodies",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("stage_errors_total", "Stages that raised", ["stage"])
+
+# (stage, seconds) of the spans run on behalf of the current request. The
+# list is shared by reference, so spans in worker threads started with a
+# copy of the request's context land here too.
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+# Hits/misses of caches that are not cache.py namespaces (disk caches)
+_cache_counts = {}
+_cache_counts_lock = threading.Lock()
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, seconds))
+
+
+def timed(stage: str):
+    """Decorator running the whole function in span(stage)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(name: str, hit: bool):
+    """Counts a lookup in a cache that keeps no counters of its own."""
+    with _cache_counts_lock:
+        counts = _cache_counts.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+class CacheCollector:
+    """Exports hit/miss counters of the cache.py namespaces and of record_cache callers."""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found an entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries evicted to stay in budget", labels=["cache"])
+        size = GaugeMetricFamily("cache_bytes", "Estimated size of the cached values", labels=["cache"])
+
+        with _cache_counts_lock:
+            counts = {name: tuple(c) for name, c in _cache_counts.items()}
+        for name, stats in cache.stats().items():
+            counts[name] = (stats["hits"], stats["misses"])
+            evictions.add_metric([name], stats["evictions"])
+            size.add_metric([name], stats["bytes"])
+
+        for name, (hit_count, miss_count) in counts.items():
+            hits.add_metric([name], hit_count)
+            misses.add_metric([name], miss_count)
+            if hit_count + miss_count:
+                ratio.add_metric([name], hit_count / (hit_count + miss_count))
+        return [hits, misses, ratio, evictions, size]
+
+
+REGISTRY.register(CacheCollector())
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value; repeated stages are summed."""
+    durations = {}
+    for stage, seconds in spans:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items())
+
+
+class TimingMiddleware:
+    """ASGI middleware collecting the request's spans into a Server-Timing header.
+
+    The header is sent with the response start, so for streamed responses it
+    only covers the work done before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans = []
+        token = _request_spans.set(spans)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(spans, time.perf_counter() - start)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+            _request_spans.reset(token)
@@ -0,0 +1,159 @@
+import asyncio
+import os
+from contextvars import ContextVar
+from typing import Optional
+
+import executors
+from executors import PoolSaturated
+from metrics import span
+from solar import predict_solar, SolarInput
+from wind import (
+    fetch_nasa_wind_data,
+    fetch_osm_wind_context,
+    evaluate_wind_farm
+)
+from soil import (
+    get_rainfall_score,
+    fetch_site_layers,
+    soil_score,
+    slope_score,
+    combine_water_scores,
+    calculate_afforestation_feasibility,
+    afforestation_error
+)
+
+# Seconds each assessment may take before it is reported as failed
+ASSESSMENT_TIMEOUT = float(os.getenv("ASSESSMENT_TIMEOUT", "60"))
+
+
+# Process-wide caps on concurrent calls to upstreams that don't go through the
+# HTTP client; Earth Engine throttles hard, so bulk screening must not exceed
+# this either. POWER and Overpass are capped per host in upstream.py.
+UPSTREAM_LIMITS = {
+    "earthengine": int(os.getenv("EARTHENGINE_CONCURRENCY", "4")),
+}
+_upstream_slots = {name: asyncio.Semaphore(limit) for name, limit in UPSTREAM_LIMITS.items()}
+
+# Pool for blocking calls; None means the shared I/O pool (executors.io).
+# Bulk jobs set their own bounded pool for the tasks they spawn.
+current_executor: ContextVar[Optional[executors.BoundedExecutor]] = ContextVar("current_executor", default=None)
+
+
+async def run_blocking(func, *args, upstream: Optional[str] = None):
+    """Runs a blocking fetch/compute function in a worker thread.
+
+    When `upstream` is given, waits for a free slot for that upstream first.
+    """
+    if upstream is None:
+        return await _run_in_executor(func, *args)
+    async with _upstream_slots[upstream]:
+        return await _run_in_executor(func, *args)
+
+
+async def _run_in_executor(func, *args):
+    # Raises PoolSaturated when the pool's queue is full
+    return await (current_executor.get() or executors.io).run(func, *args)
+
+
+class Site:
+    """One location being assessed, plus sub-fetches shared between assessments.
+
+    A shared fetch is started by whichever assessment asks for it first and
+    awaited by the rest, so e.g. water and green reuse one Earth Engine call.
+    """
+
+    def __init__(self, lat: float, lon: float, layers: Optional[dict] = None):
+        self.lat = lat
+        self.lon = lon
+        self._fetches = {}
+        if layers is not None:
+            # Earth Engine layers already evaluated in bulk (fetch_site_layers_batch)
+            self._fetches[fetch_site_layers] = asyncio.get_running_loop().create_future()
+            self._fetches[fetch_site_layers].set_result(layers)
+
+    def shared(self, func, upstream: Optional[str] = None):
+        if func not in self._fetches:
+            self._fetches[func] = asyncio.ensure_future(run_blocking(func, self.lat, self.lon, upstream=upstream))
+        # Shielded so one assessment timing out doesn't cancel it for the others
+        return asyncio.shield(self._fetches[func])
+
+
+async def run_solar(input_data: SolarInput):
+    # POWER fetches are capped per host in upstream.py, so training and
+    # prediction never hold an upstream slot
+    return await run_blocking(predict_solar, input_data)
+
+
+async def assess_solar(site: Site):
+    return await run_solar(SolarInput(latitude=site.lat, longitude=site.lon))
+
+
+async def assess_wind(site: Site):
+    wind_df, (land_use_types, infra_count, wind_turbines) = await asyncio.gather(
+        run_blocking(fetch_nasa_wind_data, site.lat, site.lon),
+        run_blocking(fetch_osm_wind_context, site.lat, site.lon)
+    )
+    if wind_df is None:
+        return {"status": "error", "message": "Failed to fetch wind data"}
+
+    avg_wind_speed = wind_df['WindSpeed'].mean()
+    return evaluate_wind_farm(avg_wind_speed, land_use_types, infra_count, wind_turbines)
+
+
+async def assess_water(site: Site):
+    rainfall_score, layers = await asyncio.gather(
+        run_blocking(get_rainfall_score, site.lat, site.lon),
+        site.shared(fetch_site_layers, upstream="earthengine")
+    )
+    return combine_water_scores(rainfall_score, soil_score(layers["soil"]), slope_score(layers["slope"]))
+
+
+async def assess_green(site: Site):
+    try:
+        layers = await site.shared(fetch_site_layers, upstream="earthengine")
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        return afforestation_error(str(e))
+    return calculate_afforestation_feasibility(site.lat, site.lon, layers)
+
+
+ASSESSMENTS = {
+    "solar": assess_solar,
+    "wind": assess_wind,
+    "water": assess_water,
+    "green": assess_green,
+}
+
+
+async def _guarded(name: str, coro, timeout: float):
+    """Awaits one assessment, turning timeouts and failures into an error result.
+
+    Worker threads cannot be cancelled, so a timed out fetch keeps running in
+    the background; only the response stops waiting for it.
+    """
+    with span(f"assess_{name}"):
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except PoolSaturated:
+            # Overload is the caller's to report (429), not a failed assessment
+            raise
+        except asyncio.TimeoutError:
+            return {"status": "error", "message": f"{name} assessment timed out after {timeout:g}s"}
+        except Exception as e:
+            return {"status": "error", "message": f"{name} assessment failed: {e}"}
+
+
+async def run_assessments(lat: float, lon: float, timeout: float = ASSESSMENT_TIMEOUT, layers: Optional[dict] = None):
+    """Runs every assessment for one location concurrently.
+
+    Returns a dict keyed by assessment name. Failed or timed out assessments
+    are returned as {"status": "error", ...} so callers always get partial results.
+    Pass `layers` when the site's Earth Engine layers were already fetched.
+    """
+    site = Site(lat, lon, layers)
+    names = list(ASSESSMENTS)
+    results = await asyncio.gather(*(
+        _guarded(name, ASSESSMENTS[name](site), timeout) for name in names
+    ))
+    return dict(zip(names, results))
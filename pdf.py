@@ -0,0 +1,163 @@
+import os
+import time
+import uuid
+from typing import Optional
+
+import markdown2
+from prometheus_client import Histogram
+
+import executors
+from metrics import span
+
+# PDFs are rendered by a dedicated pool of warm worker processes: each worker
+# imports WeasyPrint, parses the report stylesheet and loads the font
+# configuration once, in the pool initializer, instead of on every report.
+# Markdown jobs queue on the pool (bounded like the other pools, so a burst of
+# reports gets a 429 instead of an unbounded backlog).
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(os.cpu_count() or 2, 4))))
+PDF_MAX_PENDING = int(os.getenv("PDF_MAX_PENDING", str(4 * PDF_WORKERS)))
+
+PAGE_SECONDS = Histogram(
+    "pdf_render_seconds_per_page", "PDF layout + write time divided by the page count",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+PAGES = Histogram("pdf_pages", "Pages per rendered PDF", buckets=(1, 2, 3, 5, 8, 13, 21, 34))
+
+REPORT_CSS = """
+body {
+    font-family: Arial, sans-serif;
+    margin: 20px;
+    line-height: 1.6;
+}
+h2, h3 {
+    color: #333;
+}
+table {
+    width: 100%;
+    border-collapse: collapse;
+    margin: 20px 0;
+    page-break-inside: avoid;
+}
+th, td {
+    border: 1px solid #ddd;
+    padding: 8px 12px;
+    text-align: left;
+    vertical-align: top;
+}
+th {
+    background-color: #f4f4f4;
+    font-weight: bold;
+}
+tr:nth-child(even) {
+    background-color: #f9f9f9;
+}
+/* Ensure tables don't overflow page width */
+table {
+    word-wrap: break-word;
+    table-layout: fixed;
+}
+/* Add some spacing between sections */
+h2 {
+    margin-top: 30px;
+}
+"""
+
+# The stylesheet is passed to WeasyPrint pre-parsed, so the page itself has no <style>
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+    <head>
+        <meta charset="utf-8">
+        <title>Sustainability Report</title>
+    </head>
+    <body>
+        <div class="content">
+            {content}
+        </div>
+    </body>
+</html>
+"""
+
+# (HTML class, parsed REPORT_CSS, FontConfiguration), built once per process
+_renderer = None
+
+
+def load_weasyprint():
+    """Imports WeasyPrint on first use; it takes seconds, so it is kept off the import path."""
+    from weasyprint import HTML
+    return HTML
+
+
+def init_renderer():
+    """Pool initializer: imports WeasyPrint and parses the stylesheet and fonts once per process."""
+    global _renderer
+    if _renderer is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        HTML = load_weasyprint()
+        font_config = FontConfiguration()
+        _renderer = (HTML, CSS(string=REPORT_CSS, font_config=font_config), font_config)
+    return _renderer
+
+
+def render(md_content: str, pdf_filename: str) -> dict:
+    """Renders Markdown to pdf_filename in this process; returns the page count and seconds taken.
+
+    The PDF is written to a temporary file and renamed, so readers never see
+    a partial file.
+    """
+    HTML, stylesheet, font_config = init_renderer()
+    html = REPORT_TEMPLATE.format(content=markdown2.markdown(md_content, extras=["tables"]))
+
+    start = time.perf_counter()
+    document = HTML(string=html).render(
+        stylesheets=[stylesheet],
+        font_config=font_config,
+        presentational_hints=True  # Helps with some table rendering
+    )
+    tmp_filename = f"{pdf_filename}.{os.getpid()}.tmp"
+    try:
+        document.write_pdf(tmp_filename)
+        os.replace(tmp_filename, pdf_filename)
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return {"path": pdf_filename, "pages": len(document.pages), "seconds": time.perf_counter() - start}
+
+
+render_pool = executors.bounded_process_pool("pdf", PDF_WORKERS, PDF_MAX_PENDING, initializer=init_renderer)
+
+
+def _warm_worker():
+    # Returns nothing: the renderer holds font handles that can't be pickled,
+    # and unpickling its HTML class would import WeasyPrint in the parent
+    init_renderer()
+
+
+def warm_pool():
+    """Starts a render worker (running its initializer) so the first report doesn't pay for it."""
+    render_pool.call(_warm_worker)
+
+
+def _record(result: dict):
+    pages = max(result["pages"], 1)
+    PAGES.observe(pages)
+    PAGE_SECONDS.observe(result["seconds"] / pages)
+    print(f"Rendered {result['path']}: {pages} page(s), {result['seconds'] / pages * 1000:.0f} ms/page")
+
+
+def generate_pdf(md_content: str, pdf_filename: Optional[str] = None) -> str:
+    """Converts Markdown content to PDF on the render pool and saves it (to pdf_filename if given).
+
+    Blocks the calling thread until the PDF is written; raises
+    executors.PoolSaturated when the render queue is full.
+    """
+    # Create a unique PDF filename using UUID
+    if pdf_filename is None:
+        pdf_filename = f"static/pdfs/summary_{uuid.uuid4().hex}.pdf"
+
+    with span("pdf_render"):
+        result = render_pool.call(render, md_content, pdf_filename)
+    _record(result)
+    return result["path"]
@@ -0,0 +1,465 @@
+import codecs
+import fcntl
+import os
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from singleflight import single_flight
+from metrics import record_cache, span, timed
+from upstream import get_json, get_streamed, UpstreamError
+
+NASA_POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+NASA_POWER_MONTHLY_URL = "https://power.larc.nasa.gov/api/temporal/monthly/point"
+
+# POWER meteorology comes from MERRA-2 (0.5° x 0.625°), so every point inside a
+# grid cell gets the same series. Requests are snapped to the cell centre.
+POWER_LAT_STEP = 0.5
+POWER_LON_STEP = 0.625
+
+# Daily parameters used by the assessments. They are always fetched together
+# over the union of the consumers' date ranges, so one POWER round-trip per
+# grid cell serves solar, wind and rainfall.
+POWER_PARAMETERS = ("ALLSKY_SFC_SW_DWN", "PRECTOTCORR", "WS10M")
+POWER_START = "19810101"
+POWER_END = "20241231"
+POWER_FILL_VALUE = -999.0  # POWER's marker for days without data
+
+POWER_CACHE_DIR = os.getenv("POWER_CACHE_DIR", "cache/power")
+POWER_CACHE_TTL = float(os.getenv("POWER_CACHE_TTL", str(30 * 24 * 3600)))
+POWER_CACHE_MAX_ENTRIES = int(os.getenv("POWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+def snap_to_grid(lat: float, lon: float) -> Tuple[float, float]:
+    """Returns the centre of the POWER grid cell containing (lat, lon)."""
+    lat = min(max(lat, -90.0), 90.0)
+    snapped_lat = round(round(lat / POWER_LAT_STEP) * POWER_LAT_STEP, 4)
+    snapped_lon = round(round(lon / POWER_LON_STEP) * POWER_LON_STEP, 4)
+    if snapped_lon >= 180.0:
+        snapped_lon = round(snapped_lon - 360.0, 4)
+    return snapped_lat, snapped_lon
+
+
+class PowerSeries:
+    """A daily POWER series: one float32 value per day from `start` on.
+
+    Dates are never stored; they are implied by `start` and the array length,
+    and slicing returns views on the same buffer.
+    """
+
+    __slots__ = ("parameter", "start", "values")
+
+    def __init__(self, parameter: str, start: np.datetime64, values: np.ndarray):
+        self.parameter = parameter
+        self.start = np.datetime64(start, "D")
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return np.arange(self.start, self.start + len(self.values), dtype="datetime64[D]")
+
+    def slice(self, start: str, end: str) -> "PowerSeries":
+        """Days start..end inclusive (YYYYMMDD)."""
+        first = max(0, int((_day(start) - self.start).astype(int)))
+        last = min(len(self.values), int((_day(end) - self.start).astype(int)) + 1)
+        return PowerSeries(self.parameter, self.start + first, self.values[first:max(first, last)])
+
+    def monthly_means(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (months as datetime64[M], mean value per month)."""
+        months = self.dates.astype("datetime64[M]")
+        index = (months - months[0]).astype(int)
+        sums = np.bincount(index, weights=self.values)
+        counts = np.bincount(index)
+        return months[0] + np.arange(len(counts)), sums / counts
+
+
+def _day(yyyymmdd: str) -> np.datetime64:
+    return np.datetime64(f"{yyyymmdd[:4]}-{yyyymmdd[4:6]}-{yyyymmdd[6:8]}", "D")
+
+
+def parse_daily(parameter: str, values: Dict[str, float], start: str = POWER_START, end: str = POWER_END) -> PowerSeries:
+    """Builds a PowerSeries straight from POWER's {YYYYMMDD: value} mapping.
+
+    POWER returns every day of the requested range in order, so the values
+    are copied into a float32 array without parsing any date strings. If the
+    payload doesn't cover the range exactly, it is placed by its keys instead.
+    """
+    first, last = _day(start), _day(end)
+    n_days = int((last - first).astype(int)) + 1
+    if len(values) == n_days and start in values and end in values:
+        return PowerSeries(parameter, first, np.fromiter(values.values(), dtype=np.float32, count=n_days))
+
+    array = np.full(n_days, np.nan, dtype=np.float32)
+    for date, value in values.items():
+        offset = int((_day(date) - first).astype(int))
+        if 0 <= offset < n_days:
+            array[offset] = value
+    return PowerSeries(parameter, first, array)
+
+
+def _cache_path(parameter: str, lat: float, lon: float) -> str:
+    name = f"series_{parameter}_{POWER_START}_{POWER_END}_{lat}_{lon}.npz"
+    return os.path.join(POWER_CACHE_DIR, name)
+
+
+def _touch(path: str, written_at: float):
+    # Bump the access time only; mtime stays the write time used for the TTL
+    os.utime(path, (time.time(), written_at))
+
+
+def _fresh(path: str) -> Optional[float]:
+    written_at = os.path.getmtime(path)
+    return written_at if time.time() - written_at <= POWER_CACHE_TTL else None
+
+
+def _atomic_savez(path: str, **arrays):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    # Atomic rename, so other workers never see a half-written file
+    os.replace(tmp_path, path)
+
+
+def _read_series(path: str, parameter: str) -> Optional[PowerSeries]:
+    try:
+        written_at = _fresh(path)
+        if written_at is None:
+            return None
+        with np.load(path) as stored:
+            series = PowerSeries(parameter, stored["start"][()], stored["values"])
+        _touch(path, written_at)
+        return series
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_series(path: str, series: PowerSeries):
+    _atomic_savez(path, start=np.array(series.start), values=series.values)
+
+
+def _read_cached(path: str) -> Optional[Dict[str, float]]:
+    try:
+        written_at = _fresh(path)
+        if written_at is None:
+            return None
+        with np.load(path) as stored:
+            series = dict(zip(stored["keys"].tolist(), stored["values"].tolist()))
+        _touch(path, written_at)
+        return series
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cached(path: str, series: Dict[str, float]):
+    _atomic_savez(
+        path,
+        keys=np.array(list(series.keys()), dtype=str),
+        values=np.array(list(series.values()), dtype=np.float64)
+    )
+
+
+def _cell_of(path: str) -> Tuple[str, str]:
+    # Cache and lock file names end in _<lat>_<lon>
+    return tuple(os.path.splitext(os.path.basename(path))[0].rsplit("_", 2)[-2:])
+
+
+def evict_cache(max_entries: int = POWER_CACHE_MAX_ENTRIES, ttl: float = POWER_CACHE_TTL):
+    """Removes expired entries, then least recently used ones above max_entries.
+
+    A cell's lock file goes with its last daily series, unless a fetch holds it.
+    """
+    now = time.time()
+    entries = []
+    locks = []
+    for entry in os.scandir(POWER_CACHE_DIR):
+        if entry.name.endswith(".lock"):
+            locks.append(entry.path)
+            continue
+        if not entry.name.endswith(".npz"):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > ttl:
+            _remove(entry.path)
+        else:
+            entries.append((stat.st_atime, entry.path))
+
+    entries.sort()
+    excess = max(0, len(entries) - max_entries)
+    for _, path in entries[:excess]:
+        _remove(path)
+
+    cached_cells = {
+        _cell_of(path) for _, path in entries[excess:] if os.path.basename(path).startswith("series_")
+    }
+    for path in locks:
+        if _cell_of(path) not in cached_cells:
+            _remove_lock(path)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _remove_lock(path: str):
+    try:
+        with open(path, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # A fetch for this cell is running
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def _lock(path: str):
+    """Opens path and takes an exclusive flock on it, blocking until it is free.
+
+    evict_cache may unlink the file between our open and flock; a lock on the
+    unlinked inode would exclude nobody, so that case retries on a new file.
+    """
+    while True:
+        lock = open(path, "w")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if os.fstat(lock.fileno()).st_ino == os.stat(path).st_ino:
+                return lock
+        except FileNotFoundError:
+            pass
+        lock.close()
+
+
+@timed("power_download")
+def _download(parameters, lat: float, lon: float):
+    params = {
+        "parameters": ",".join(parameters),
+        "community": "RE",
+        "longitude": lon,
+        "latitude": lat,
+        "start": POWER_START,
+        "end": POWER_END,
+        "format": "JSON"
+    }
+    try:
+        data = get_json(NASA_POWER_URL, params=params)
+    except UpstreamError as e:
+        print(f"NASA POWER request failed: {e}")
+        return None
+    values = data['properties']['parameter']
+    return {parameter: parse_daily(parameter, values[parameter]) for parameter in parameters}
+
+
+def _read_all(paths: Dict[str, str]) -> Dict[str, PowerSeries]:
+    cached = {}
+    for parameter, path in paths.items():
+        series = _read_series(path, parameter)
+        if series is not None:
+            cached[parameter] = series
+    return cached
+
+
+@single_flight(lambda lat, lon, parameters=POWER_PARAMETERS: ("power", *snap_to_grid(lat, lon), tuple(parameters)))
+def fetch_point(lat: float, lon: float, parameters=POWER_PARAMETERS) -> Optional[Dict[str, PowerSeries]]:
+    """Fetches daily POWER series for the grid cell containing (lat, lon).
+
+    Parameters missing from the on-disk cache are requested together in one
+    comma-separated POWER call covering POWER_START..POWER_END, then stored
+    per parameter. Series survive restarts and are shared by every worker
+    process. Concurrent calls for one cell in this process share a single
+    flight, and a per-cell file lock makes other worker processes wait for
+    the download instead of repeating it.
+    Returns {parameter: PowerSeries}, or None if the request failed.
+    """
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    paths = {parameter: _cache_path(parameter, cell_lat, cell_lon) for parameter in parameters}
+
+    series = _read_all(paths)
+    record_cache("power", len(series) == len(paths))
+    if len(series) == len(paths):
+        return series
+
+    os.makedirs(POWER_CACHE_DIR, exist_ok=True)
+    lock_path = os.path.join(POWER_CACHE_DIR, f"daily_{cell_lat}_{cell_lon}.lock")
+    with span("power_lock_wait"):
+        lock = _lock(lock_path)
+    with lock:
+        try:
+            # Another thread or worker may have filled the cell while we waited
+            series = _read_all(paths)
+            missing = [parameter for parameter in parameters if parameter not in series]
+            if not missing:
+                return series
+
+            downloaded = _download(missing, cell_lat, cell_lon)
+            if downloaded is None:
+                return None
+            for parameter, values in downloaded.items():
+                _write_series(paths[parameter], values)
+            series.update(downloaded)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    evict_cache()
+    return series
+
+
+def fetch_series(lat: float, lon: float, parameter: str, start: str = POWER_START, end: str = POWER_END) -> Optional[PowerSeries]:
+    """Returns one daily parameter for (lat, lon), limited to start..end (YYYYMMDD)."""
+    point = fetch_point(lat, lon)
+    if point is None:
+        return None
+    return point[parameter].slice(start, end)
+
+
+class SeriesSum:
+    """Sums one parameter's values while a POWER JSON response streams in.
+
+    Only the current chunk and an unparsed tail are kept in memory, never the
+    whole document or a list of values. Expects a single-parameter response,
+    where {"parameter": {"<NAME>": {"<date>": value, ...}}} is the first
+    occurrence of the parameter block. Days holding POWER_FILL_VALUE are
+    left out of both the sum and the count.
+    """
+
+    _START = re.compile(r'"parameter"\s*:\s*\{\s*"(\w+)"\s*:\s*\{')
+    _PAIR = re.compile(r'\s*"\d+"\s*:\s*(-?[0-9.eE+-]+)\s*([,}])')
+
+    def __init__(self, parameter: str):
+        self.parameter = parameter
+        self.total = 0.0
+        self.count = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._in_series = False
+        self._done = False
+
+    def feed(self, chunk: bytes):
+        if self._done:
+            return
+        self._buffer += self._decoder.decode(chunk)
+
+        if not self._in_series:
+            start = self._START.search(self._buffer)
+            if start is None:
+                # Keep a tail in case the opening pattern is split across chunks
+                self._buffer = self._buffer[-256:]
+                return
+            if start.group(1) != self.parameter:
+                raise ValueError(f"Expected {self.parameter}, got {start.group(1)}")
+            self._buffer = self._buffer[start.end():]
+            self._in_series = True
+
+        pos = 0
+        while True:
+            pair = self._PAIR.match(self._buffer, pos)
+            if pair is None:
+                break
+            value = float(pair.group(1))
+            if value != POWER_FILL_VALUE:
+                self.total += value
+                self.count += 1
+            pos = pair.end()
+            if pair.group(2) == "}":
+                self._done = True
+                break
+        self._buffer = self._buffer[pos:]
+
+    def result(self):
+        if not self._done:
+            raise ValueError(f"Response ended before the {self.parameter} series was complete")
+        return self.total, self.count
+
+
+def _read_sum(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        written_at = _fresh(path)
+        if written_at is None:
+            return None
+        with np.load(path) as stored:
+            summed = float(stored["total"]), int(stored["count"])
+        _touch(path, written_at)
+        return summed
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+@single_flight(lambda lat, lon, parameter, start=POWER_START, end=POWER_END: ("power-stream", *snap_to_grid(lat, lon), parameter, start, end))
+def stream_series_sum(lat: float, lon: float, parameter: str, start: str = POWER_START, end: str = POWER_END) -> Optional[Tuple[float, int]]:
+    """Streams one daily parameter for the grid cell and returns (sum, count) of its values.
+
+    The result is cached on disk per cell and date range like the other POWER data.
+    """
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    path = os.path.join(POWER_CACHE_DIR, f"sum_{parameter}_{start}_{end}_{cell_lat}_{cell_lon}.npz")
+    summed = _read_sum(path)
+    record_cache("power-stream", summed is not None)
+    if summed is not None:
+        return summed
+
+    params = {
+        "parameters": parameter,
+        "community": "RE",
+        "longitude": cell_lon,
+        "latitude": cell_lat,
+        "start": start,
+        "end": end,
+        "format": "JSON"
+    }
+    try:
+        with span("power_stream"):
+            summed = get_streamed(NASA_POWER_URL, lambda: SeriesSum(parameter), params=params)
+    except (UpstreamError, ValueError) as e:
+        print(f"NASA POWER streaming request failed: {e}")
+        return None
+
+    os.makedirs(POWER_CACHE_DIR, exist_ok=True)
+    _atomic_savez(path, total=np.float64(summed[0]), count=np.int64(summed[1]))
+    evict_cache()
+    return summed
+
+
+@single_flight(lambda lat, lon, parameter, start_year, end_year: ("power-monthly", *snap_to_grid(lat, lon), parameter, start_year, end_year))
+def fetch_monthly(lat: float, lon: float, parameter: str, start_year: int, end_year: int) -> Optional[Dict[str, float]]:
+    """Fetches POWER monthly aggregates ({YYYYMM: value}; month 13 is the annual value).
+
+    About 13 values per year instead of ~365, cached on disk like the daily series.
+    """
+    cell_lat, cell_lon = snap_to_grid(lat, lon)
+    path = os.path.join(POWER_CACHE_DIR, f"monthly_{parameter}_{start_year}_{end_year}_{cell_lat}_{cell_lon}.npz")
+    series = _read_cached(path)
+    record_cache("power-monthly", series is not None)
+    if series is not None:
+        return series
+
+    params = {
+        "parameters": parameter,
+        "community": "RE",
+        "longitude": cell_lon,
+        "latitude": cell_lat,
+        "start": start_year,
+        "end": end_year,
+        "format": "JSON"
+    }
+    try:
+        with span("power_monthly_download"):
+            data = get_json(NASA_POWER_MONTHLY_URL, params=params)
+    except UpstreamError as e:
+        print(f"NASA POWER monthly request failed: {e}")
+        return None
+
+    series = data['properties']['parameter'][parameter]
+    os.makedirs(POWER_CACHE_DIR, exist_ok=True)
+    _write_cached(path, series)
+    evict_cache()
+    return series
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+from metrics import record_cache
+
+# Reports are addressed by a hash of the assessment data, so a repeat
+# assessment of the same site reuses its summary and PDF instead of paying
+# for another Gemini call and render.
+PDF_DIR = "static/pdfs"
+SUMMARY_DIR = os.getenv("SUMMARY_CACHE_DIR", "cache/summaries")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+PDF_CACHE_MAX_AGE = float(os.getenv("PDF_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def canonical_json(data) -> str:
+    """Stable serialization: sorted keys, no whitespace, numpy scalars as plain numbers."""
+    return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+def content_hash(data) -> str:
+    return hashlib.sha256(canonical_json(data).encode("utf-8")).hexdigest()
+
+
+def pdf_path(key: str) -> str:
+    return os.path.join(PDF_DIR, f"summary_{key}.pdf")
+
+
+def _summary_path(key: str) -> str:
+    return os.path.join(SUMMARY_DIR, f"{key}.md")
+
+
+def _touch(path: str) -> bool:
+    """Marks a cache entry as used; returns False if it doesn't exist."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def cached_pdf(key: str) -> Optional[str]:
+    path = pdf_path(key)
+    hit = _touch(path)
+    record_cache("report-pdf", hit)
+    return path if hit else None
+
+
+def cached_summary(key: str) -> Optional[str]:
+    path = _summary_path(key)
+    hit = _touch(path)
+    record_cache("report-summary", hit)
+    if not hit:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def store_summary(key: str, summary: str):
+    os.makedirs(SUMMARY_DIR, exist_ok=True)
+    path = _summary_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(tmp_path, path)
+    evict(SUMMARY_DIR, SUMMARY_CACHE_MAX_BYTES, PDF_CACHE_MAX_AGE)
+
+
+def evict(directory: str, max_bytes: int, max_age: float):
+    """Deletes files unused for max_age, then least recently used ones until under max_bytes.
+
+    Cache hits touch their file, so mtime is the last use.
+    """
+    now = time.time()
+    entries = []
+    for entry in os.scandir(directory):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age:
+            _remove(entry.path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def evict_pdfs():
+    evict(PDF_DIR, PDF_CACHE_MAX_BYTES, PDF_CACHE_MAX_AGE)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,171 @@
+import os
+from typing import List, Optional
+
+# Deterministic Markdown report built straight from the /getall data, as a
+# fast alternative to asking Gemini for the whole summary. The sections
+# follow the structure ai.global_context asks the LLM for. Select it with
+# REPORT_ENGINE=template; with REPORT_NARRATIVE=1 Gemini writes only the
+# executive summary paragraph, and the templated one is used if that fails.
+REPORT_ENGINE = os.getenv("REPORT_ENGINE", "llm")  # "llm" or "template"
+REPORT_NARRATIVE = os.getenv("REPORT_NARRATIVE", "0") == "1"
+REPORT_YEAR = "2024"
+
+WATER_GOOD = 0.6
+WATER_MODERATE = 0.4
+
+
+def _value(result, key: str, default: str = "N/A") -> str:
+    value = result.get(key) if isinstance(result, dict) else None
+    return default if value in (None, "") else str(value)
+
+
+def _failed(result) -> bool:
+    return not isinstance(result, dict) or result.get("status") == "error"
+
+
+def _cell(text: str) -> str:
+    # Pipes would split the Markdown table cell
+    return text.replace("|", "/").replace("\n", " ")
+
+
+def solar_finding(result) -> tuple:
+    """(value, assessment, feasible) for the solar result; feasible is None if unknown."""
+    if _failed(result) or "value" not in result:
+        return "N/A", _value(result, "message", "Solar assessment unavailable"), None
+    value = result["value"]
+    try:
+        feasible = float(value.split()[0]) >= 3.5
+    except (ValueError, IndexError):
+        feasible = None
+    return f"{value}/day", _value(result, "result"), feasible
+
+
+def wind_finding(result) -> tuple:
+    if _failed(result):
+        return "N/A", _value(result, "message", "Wind assessment unavailable"), None
+    status = _value(result, "status")
+    assessment = _value(result, "message")
+    if status == "feasible":
+        assessment += f" Recommended turbine: {_value(result, 'recommended_turbine')}."
+    speed = _value(result, "avg_wind_speed")
+    if speed != "N/A":
+        speed = speed if speed.endswith("m/s") else f"{float(speed):.2f} m/s"
+        speed = f"Average wind speed {speed}"
+    return speed, assessment, {"feasible": True, "exists": False}.get(status, False)
+
+
+def water_finding(result) -> tuple:
+    if _failed(result) or "water_harvesting_score" not in result:
+        return "N/A", _value(result, "message", "Water assessment unavailable"), None
+    score = float(result["water_harvesting_score"])
+    if score >= WATER_GOOD:
+        assessment = "High rainwater harvesting potential."
+    elif score >= WATER_MODERATE:
+        assessment = "Moderate rainwater harvesting potential."
+    else:
+        assessment = "Low rainwater harvesting potential."
+    details = (f"rainfall {result.get('rainfall_score')}, soil {result.get('soil_score')}, "
+               f"slope {result.get('slope_score')}")
+    return f"Score {score:.3f} ({details})", assessment, score >= WATER_MODERATE
+
+
+def green_finding(result) -> tuple:
+    if _failed(result):
+        return "N/A", _value(result, "message", "Afforestation assessment unavailable"), None
+    value = f"Green cover {_value(result, 'green_coverage')}%, barren/open {_value(result, 'barren_coverage')}%"
+    feasible = bool(result.get("is_feasible"))
+    if feasible:
+        assessment = "Afforestation is feasible (over 20% green cover and over 10% barren/open land)."
+    else:
+        assessment = "Afforestation is not feasible (needs over 20% green cover and over 10% barren/open land)."
+    return value, assessment, feasible
+
+
+FINDINGS = {
+    "Solar": ("solar", solar_finding),
+    "Wind": ("wind", wind_finding),
+    "Water harvesting": ("water", water_finding),
+    "Afforestation": ("green", green_finding),
+}
+
+
+def _join(names: List[str]) -> str:
+    names = [name.lower() for name in names]
+    return names[0] if len(names) == 1 else f"{', '.join(names[:-1])} and {names[-1]}"
+
+
+def _feasibility(feasible: Optional[bool]) -> str:
+    return {True: "Feasible", False: "Not feasible", None: "Unknown"}[feasible]
+
+
+def executive_summary(findings: dict) -> str:
+    feasible = [name for name, (_, _, ok) in findings.items() if ok]
+    unknown = [name for name, (_, _, ok) in findings.items() if ok is None]
+    if feasible:
+        text = f"The site shows potential for {_join(feasible)}."
+    else:
+        text = "None of the assessed options is clearly feasible at this site."
+    not_feasible = [name for name, (_, _, ok) in findings.items() if ok is False]
+    if not_feasible:
+        text += f" {_join(not_feasible).capitalize()} did not meet the feasibility criteria."
+    if unknown:
+        text += f" Data for {_join(unknown)} could not be obtained."
+    return text
+
+
+def recommendations(data: dict, findings: dict) -> List[str]:
+    items = []
+    solar_ok, wind_ok = findings["Solar"][2], findings["Wind"][2]
+    if solar_ok:
+        items.append("Proceed with a detailed solar PV design and grid-connection study.")
+    if wind_ok:
+        items.append("Commission an on-site wind measurement campaign (at least 12 months) before turbine procurement.")
+    if solar_ok and wind_ok:
+        items.append("Evaluate a hybrid solar-wind installation to smooth seasonal generation.")
+    if _value(data.get("wind"), "status") == "exists":
+        items.append("An existing wind farm is nearby; consider grid capacity and shared infrastructure.")
+    if findings["Water harvesting"][2]:
+        items.append("Install rainwater harvesting (rooftop collection, recharge pits or check dams).")
+    if findings["Afforestation"][2]:
+        items.append("Plan native-species afforestation on the barren/open land.")
+    elif findings["Afforestation"][2] is False:
+        items.append("Restore soil and vegetation cover before large-scale planting.")
+    unknown = [name for name, (_, _, ok) in findings.items() if ok is None]
+    if unknown:
+        items.append(f"Re-run the assessment for {_join(unknown)} once data is available.")
+    if not items:
+        items.append("Consider alternative land uses; none of the assessed options is recommended here.")
+    return items
+
+
+def render_report(data: dict, narrative: Optional[str] = None) -> str:
+    """Markdown sustainability report for /getall data; narrative replaces the templated executive summary."""
+    findings = {
+        name: finding(data.get(key)) for name, (key, finding) in FINDINGS.items()
+    }
+
+    lines = [
+        "# Sustainability Assessment Report",
+        "",
+        f"**Reporting period:** {REPORT_YEAR}",
+        "",
+        "## Location",
+        "",
+        f"- **Latitude:** {data.get('latitude', 'N/A')}",
+        f"- **Longitude:** {data.get('longitude', 'N/A')}",
+        "",
+        "## Executive Summary",
+        "",
+        (narrative or executive_summary(findings)).strip(),
+        "",
+        "## Detailed Analysis",
+        "",
+        "| Assessment | Result | Feasibility | Details |",
+        "| --- | --- | --- | --- |",
+    ]
+    for name, (value, assessment, feasible) in findings.items():
+        lines.append(f"| {name} | {_cell(value)} | {_feasibility(feasible)} | {_cell(assessment)} |")
+
+    lines += ["", "## Recommendations", ""]
+    lines += [f"{i}. {item}" for i, item in enumerate(recommendations(data, findings), 1)]
+    return "\n".join(lines) + "\n"
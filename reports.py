@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import executors
+from executors import PoolSaturated
+from ai import get_narrative, get_summary, stream_summary
+from pdf import generate_pdf
+from report_cache import content_hash, cached_pdf, cached_summary, store_summary, pdf_path, evict_pdfs
+from report_template import REPORT_ENGINE, REPORT_NARRATIVE, render_report
+from singleflight import flights
+
+# Report jobs run here instead of in the request. The jobs themselves mostly
+# wait: Gemini calls go to the LLM pool (see executors.py) and PDF rendering
+# to the render pool in pdf.py. Job state is kept as small JSON files so any
+# uvicorn worker can answer status polls for a job started by another one.
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+REPORT_MAX_PENDING = int(os.getenv("REPORT_MAX_PENDING", str(8 * REPORT_WORKERS)))
+REPORT_JOB_DIR = os.getenv("REPORT_JOB_DIR", "cache/report_jobs")
+REPORT_JOB_TTL = float(os.getenv("REPORT_JOB_TTL", str(24 * 3600)))
+REPORT_POLL_INTERVAL = 0.5  # Seconds between status checks for SSE subscribers
+
+FINAL_STATUSES = {"done", "failed"}
+
+# Bounded like the pools in executors.py: past REPORT_MAX_PENDING queued jobs,
+# new reports get a 429 instead of piling up here
+# report key -> id of the job building it in this process, so a summary stream
+# for the same data follows that job instead of calling Gemini a second time
+_pending_jobs = {}
+_pending_lock = threading.Lock()
+
+report_pool = executors.BoundedExecutor(
+    "report", ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report"), REPORT_MAX_PENDING
+)
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(REPORT_JOB_DIR, f"{job_id}.json")
+
+
+def _save_job(job: dict):
+    path = _job_path(job["job_id"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def _update_job(job: dict, **changes):
+    job.update(changes, updated_at=time.time())
+    _save_job(job)
+
+
+def get_report_job(job_id: str) -> Optional[dict]:
+    # Job ids are uuid hex; anything else could escape REPORT_JOB_DIR
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_jobs():
+    now = time.time()
+    for entry in os.scandir(REPORT_JOB_DIR):
+        try:
+            if now - entry.stat().st_mtime > REPORT_JOB_TTL:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _new_job(**fields) -> dict:
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "summary_link": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    job.update(fields)
+    _save_job(job)
+    return job
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def _report_key(data: dict) -> str:
+    """Cache key of the report for `data`; templated reports are kept apart from Gemini's."""
+    if REPORT_ENGINE != "template":
+        return content_hash(data)
+    engine = "template+narrative" if REPORT_NARRATIVE else "template"
+    return content_hash({"engine": engine, "data": data})
+
+
+def _template_summary(data: dict) -> str:
+    """The templated report; with REPORT_NARRATIVE its executive summary comes from Gemini."""
+    narrative = None
+    if REPORT_NARRATIVE:
+        try:
+            narrative = executors.llm.call(get_narrative, data)
+        except Exception as e:
+            print(f"Narrative enrichment failed, using the templated summary: {getattr(e, 'detail', e)}")
+    return render_report(data, narrative)
+
+
+def _render_report(key: str, summary: str) -> str:
+    pdf_file_path = generate_pdf(summary, pdf_path(key))
+    evict_pdfs()
+    return pdf_file_path
+
+
+def _build_report(key: str, data: dict) -> str:
+    summary = cached_summary(key)
+    if summary is None:
+        if REPORT_ENGINE == "template":
+            summary = _template_summary(data)
+        else:
+            summary = executors.llm.call(get_summary, data)
+        store_summary(key, summary)
+    return _render_report(key, summary)
+
+
+def _run_report(job: dict, key: str, status: str, build, *args):
+    try:
+        _update_job(job, status=status)
+        # Identical reports requested concurrently are built once
+        pdf_file_path = flights.do(("report", key), build, *args)
+
+        _update_job(job, status="done", summary_link=f"static/pdfs/{os.path.basename(pdf_file_path)}")
+    except Exception as e:
+        # get_summary raises HTTPException, whose message lives in .detail
+        _update_job(job, status="failed", error=str(getattr(e, "detail", e)))
+    finally:
+        with _pending_lock:
+            if _pending_jobs.get(key) == job["job_id"]:
+                del _pending_jobs[key]
+
+
+def _start_job(key: str, status: str, build, *args) -> dict:
+    """Creates a job for the report `key`, done at once if its PDF is cached, else queued on report_pool.
+
+    Raises PoolSaturated when report_pool is full.
+    """
+    os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+    _prune_jobs()
+
+    existing = cached_pdf(key)
+    if existing is not None:
+        return _new_job(status="done", summary_link=f"static/pdfs/{os.path.basename(existing)}")
+
+    job = _new_job()
+    with _pending_lock:
+        _pending_jobs.setdefault(key, job["job_id"])
+    try:
+        report_pool.submit(_run_report, job, key, status, build, *args)
+    except PoolSaturated:
+        with _pending_lock:
+            if _pending_jobs.get(key) == job["job_id"]:
+                del _pending_jobs[key]
+        os.remove(_job_path(job["job_id"]))
+        raise
+    return job
+
+
+def submit_report(data: dict) -> str:
+    """Queues summary + PDF generation for the assessment data and returns the job id.
+
+    Reports are addressed by _report_key(data); if this data already has a
+    PDF the job is created as done, without touching the worker pool.
+    """
+    key = _report_key(data)
+    return _start_job(key, "summarizing", _build_report, key, data)["job_id"]
+
+
+async def _iterate_in_thread(generator_func, *args):
+    """Runs a blocking generator on the LLM pool and yields its items on the event loop."""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stopped = threading.Event()
+    done = object()
+
+    def run():
+        try:
+            for item in generator_func(*args):
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(items.put_nowait, (item, None))
+            loop.call_soon_threadsafe(items.put_nowait, (done, None))
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, (None, e))
+
+    executors.llm.submit(run)
+    try:
+        while True:
+            item, error = await items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        # Client went away; stop pulling from the generator
+        stopped.set()
+
+
+async def _follow_job(key: str, job_id: str):
+    """Relays a running job's status events, sending its summary as one chunk once it is stored."""
+    sent = False
+    async for event in report_events(job_id):
+        if not sent:
+            summary = await executors.io.run(cached_summary, key)
+            if summary is not None:
+                sent = True
+                yield _sse("chunk", {"text": summary})
+        yield event
+
+
+async def stream_report(data: dict):
+    """Yields SSE events for a report: the summary as it is generated, then the PDF job.
+
+    'chunk' events carry Markdown pieces of the summary as Gemini streams them
+    (a cached or templated summary arrives as one chunk). Once the summary is
+    complete a PDF job is started and its 'status' events follow, as in
+    report_events, until the link is ready. If a job is already building the
+    report (started by /getall), the stream follows it instead: its summary
+    arrives as one chunk when ready. An 'error' event ends the stream on failure.
+    """
+    key = _report_key(data)
+    try:
+        summary = await executors.io.run(cached_summary, key)
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+        return
+
+    pending_job = _pending_jobs.get(key)
+    if summary is None and pending_job is not None:
+        async for event in _follow_job(key, pending_job):
+            yield event
+        return
+
+    if summary is not None:
+        yield _sse("chunk", {"text": summary})
+    elif REPORT_ENGINE == "template":
+        try:
+            summary = await executors.io.run(_template_summary, data)
+            await executors.io.run(store_summary, key, summary)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+            return
+        yield _sse("chunk", {"text": summary})
+    else:
+        parts = []
+        try:
+            async for text in _iterate_in_thread(stream_summary, data):
+                parts.append(text)
+                yield _sse("chunk", {"text": text})
+            summary = "".join(parts)
+            await executors.io.run(store_summary, key, summary)
+        except Exception as e:
+            yield _sse("error", {"error": str(getattr(e, "detail", e))})
+            return
+
+    try:
+        # Off the event loop: creating the job reads and writes job and PDF files
+        job = await executors.io.run(_start_job, key, "rendering", _render_report, key, summary)
+    except PoolSaturated as e:
+        # The response has already started, so the 429 becomes an error event
+        yield _sse("error", {"error": str(e)})
+        return
+    async for event in report_events(job["job_id"]):
+        yield event
+
+
+async def report_events(job_id: str):
+    """Yields an SSE 'status' event on every status change until the job is done or failed."""
+    last_status = None
+    while True:
+        job = get_report_job(job_id)
+        if job is None:
+            yield _sse("error", {"error": "Unknown report job"})
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield _sse("status", job)
+        if last_status in FINAL_STATUSES:
+            return
+        await asyncio.sleep(REPORT_POLL_INTERVAL)
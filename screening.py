@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+import executors
+from executors import PoolSaturated
+from orchestrator import run_assessments, run_blocking, current_executor
+from soil import fetch_site_layers_batch, EE_BATCH_SIZE
+
+SCREENING_WORKERS = int(os.getenv("SCREENING_WORKERS", "16"))  # Threads for blocking fetches
+SCREENING_CONCURRENCY = int(os.getenv("SCREENING_CONCURRENCY", "8"))  # Sites in flight per job
+SCREENING_MAX_SITES = int(os.getenv("SCREENING_MAX_SITES", "5000"))
+# Running + queued blocking calls across all screening jobs; /screen answers 429 past it
+SCREENING_MAX_PENDING = int(os.getenv("SCREENING_MAX_PENDING", str(4 * SCREENING_WORKERS)))
+
+screening_pool = executors.BoundedExecutor(
+    "screening", ThreadPoolExecutor(max_workers=SCREENING_WORKERS, thread_name_prefix="screening"),
+    SCREENING_MAX_PENDING
+)
+
+
+class ScreeningPoint(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class ScreeningRequest(BaseModel):
+    points: Optional[List[ScreeningPoint]] = None
+    bbox: Optional[List[float]] = None  # [lat_min, lon_min, lat_max, lon_max]
+    step: Optional[float] = None  # Grid spacing in degrees when bbox is given
+    resolution: float = 0.01  # Points in the same resolution cell are screened once
+
+
+def plan_sites(request: ScreeningRequest):
+    """Expands the request into unique sites.
+
+    Returns a list of {"latitude", "longitude", "points"} where "points" are
+    the requested coordinates that fall into that site's cell.
+    Raises ValueError for malformed or oversized requests.
+    """
+    points = [(p.latitude, p.longitude) for p in request.points or []]
+    if request.bbox is not None:
+        if len(request.bbox) != 4 or not request.step or request.step <= 0:
+            raise ValueError("bbox needs [lat_min, lon_min, lat_max, lon_max] and a positive step.")
+        lat_min, lon_min, lat_max, lon_max = request.bbox
+        n_points = (int((lat_max - lat_min) / request.step) + 1) * (int((lon_max - lon_min) / request.step) + 1)
+        if n_points > SCREENING_MAX_SITES * 10:
+            raise ValueError(f"Grid has {n_points} points, reduce the area or increase the step.")
+        for lat in np.arange(lat_min, lat_max + 1e-9, request.step):
+            for lon in np.arange(lon_min, lon_max + 1e-9, request.step):
+                points.append((round(float(lat), 6), round(float(lon), 6)))
+    if not points:
+        raise ValueError("Provide points or a bbox with step.")
+    if request.resolution <= 0:
+        raise ValueError("resolution must be positive.")
+
+    sites = {}
+    for lat, lon in points:
+        cell = (round(lat / request.resolution), round(lon / request.resolution))
+        site = sites.setdefault(cell, {
+            "latitude": round(cell[0] * request.resolution, 6),
+            "longitude": round(cell[1] * request.resolution, 6),
+            "points": []
+        })
+        site["points"].append([lat, lon])
+
+    if len(sites) > SCREENING_MAX_SITES:
+        raise ValueError(f"{len(sites)} unique sites requested, the limit is {SCREENING_MAX_SITES}.")
+    return list(sites.values())
+
+
+async def _batch_layers(sites):
+    current_executor.set(screening_pool)
+    points = [(site["latitude"], site["longitude"]) for site in sites]
+    try:
+        return await run_blocking(fetch_site_layers_batch, points, upstream="earthengine")
+    except Exception as e:
+        # Each site falls back to its own fetch_site_layers call
+        print(f"Batched Earth Engine evaluation failed for {len(sites)} sites: {e}")
+        return [None] * len(sites)
+
+
+async def screen_sites(sites):
+    """Screens sites concurrently and yields one NDJSON line per site as it completes.
+
+    Earth Engine layers are evaluated up front in EE_BATCH_SIZE chunks, so a
+    chunk of sites costs one server call instead of one per site.
+    """
+    site_slots = asyncio.Semaphore(SCREENING_CONCURRENCY)
+
+    async def screen(site, chunk_layers, index):
+        current_executor.set(screening_pool)
+        layers = (await asyncio.shield(chunk_layers))[index]
+        async with site_slots:
+            try:
+                assessments = await run_assessments(site["latitude"], site["longitude"], layers=layers)
+            except PoolSaturated as e:
+                # Model training backed up; report the site rather than abort the whole job
+                assessments = {"status": "error", "message": str(e)}
+            return {**site, **assessments}
+
+    chunk_tasks, site_tasks = [], []
+    for offset in range(0, len(sites), EE_BATCH_SIZE):
+        chunk = sites[offset:offset + EE_BATCH_SIZE]
+        chunk_layers = asyncio.create_task(_batch_layers(chunk))
+        chunk_tasks.append(chunk_layers)
+        site_tasks.extend(asyncio.create_task(screen(site, chunk_layers, i)) for i, site in enumerate(chunk))
+
+    try:
+        for next_done in asyncio.as_completed(site_tasks):
+            yield json.dumps(await next_done, default=str) + "\n"
+    finally:
+        # Client went away or the job finished; drop any sites still queued
+        for task in chunk_tasks + site_tasks:
+            task.cancel()
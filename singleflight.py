@@ -0,0 +1,58 @@
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Hashable, Tuple
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait and receive the same result (or exception). Once
+    it finishes the key is released, so later calls run again (and typically
+    hit a cache).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+flights = SingleFlight()
+
+
+def quantize(lat: float, lon: float, step: float = 1e-5) -> Tuple[float, float]:
+    """Rounds a location to `step` degrees (~1 m by default) for use in flight keys."""
+    return round(round(lat / step) * step, 6), round(round(lon / step) * step, 6)
+
+
+def single_flight(key):
+    """Decorator running the function through `flights`, keyed by key(*args, **kwargs)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return flights.do(key(*args, **kwargs), func, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,57 +1,182 @@
-import requests
+import os
 import numpy as np
-import ee
 
-ee.Initialize(project='ecstatic-spirit-455219-c2')
+import tiles
+from earthengine import get_ee
+from metrics import span, timed
+from power import fetch_series, fetch_monthly, stream_series_sum
+from singleflight import single_flight, quantize
 
+# "daily": sum the daily series from the shared POWER fetch (default)
+# "stream": stream a dedicated daily request and sum it without materializing it
+# "monthly": use POWER's monthly aggregates, ~30x smaller than the daily series
+RAINFALL_SOURCE = os.getenv("RAINFALL_SOURCE", "daily")
+RAINFALL_START_YEAR = 1981
+RAINFALL_END_YEAR = 2024
+
+def annual_rainfall_from_monthly(series):
+    """Average yearly total (mm) from POWER monthly PRECTOTCORR (annual mean mm/day in month 13)."""
+    totals = []
+    for year in range(RAINFALL_START_YEAR, RAINFALL_END_YEAR + 1):
+        mm_per_day = series.get(f"{year}13")
+        if mm_per_day is not None:
+            days = 366 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 365
+            totals.append(mm_per_day * days)
+    return float(np.mean(totals)) if totals else None
+
+@timed("rainfall")
 def get_rainfall_score(lat, lon):
-    base_url = "https://power.larc.nasa.gov/api/temporal/daily/point"
-    params = {
-        "parameters": "PRECTOTCORR",
-        "community": "RE",
-        "longitude": lon,
-        "latitude": lat,
-        "start": "19810101",
-        "end": "20241231",
-        "format": "JSON"
-    }
+    years = RAINFALL_END_YEAR - RAINFALL_START_YEAR + 1
+    start, end = f"{RAINFALL_START_YEAR}0101", f"{RAINFALL_END_YEAR}1231"
 
-    response = requests.get(base_url, params=params)
-    if response.status_code != 200:
-        return 0.0
+    if RAINFALL_SOURCE == "monthly":
+        monthly = fetch_monthly(lat, lon, "PRECTOTCORR", RAINFALL_START_YEAR, RAINFALL_END_YEAR)
+        avg_rainfall = annual_rainfall_from_monthly(monthly) if monthly is not None else None
+        if avg_rainfall is None:
+            return 0.0
+    elif RAINFALL_SOURCE == "stream":
+        summed = stream_series_sum(lat, lon, "PRECTOTCORR", start=start, end=end)
+        if summed is None:
+            return 0.0
+        avg_rainfall = summed[0] / years
+    else:
+        rainfall = fetch_series(lat, lon, "PRECTOTCORR", start=start, end=end)
+        if rainfall is None:
+            return 0.0
 
-    data = response.json()
-    rainfall_values = list(data['properties']['parameter']['PRECTOTCORR'].values())
+        avg_rainfall = np.sum(rainfall.values, dtype=np.float64) / years
 
-    avg_rainfall = np.sum(rainfall_values) / (2024 - 1981 + 1)
     return min(avg_rainfall / 1000, 1.0)
 
-def get_soil_score(lat, lon):
-    soil = ee.Image("OpenLandMap/SOL/SOL_TEXTURE-CLASS_USDA-TT_M/v02") \
-        .select('b0') \
-        .reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=ee.Geometry.Point([lon, lat]),
-            scale=30
-        ).get('b0').getInfo()
-    
+SOIL_TEXTURE_IMAGE = "OpenLandMap/SOL/SOL_TEXTURE-CLASS_USDA-TT_M/v02"
+ELEVATION_IMAGE = "USGS/SRTMGL1_003"
+GREEN_RADIUS = 5000  # 5km radius for the land cover analysis
+EE_BATCH_SIZE = int(os.getenv("EE_BATCH_SIZE", "250"))  # Sites per reduceRegions call
+
+def soil_score(soil):
     return min(soil / 100, 1.0) if soil else 0.0
 
-def get_slope_score(lat, lon):
-    slope = ee.Terrain.slope(ee.Image("USGS/SRTMGL1_003")) \
-        .reduceRegion(
+def slope_score(slope):
+    return min(slope / 45, 1.0) if slope else 0.0
+
+def ndvi_image(area):
+    """NDVI of a cloud-filtered 2020-2023 Sentinel-2 median composite."""
+    ee = get_ee()
+    s2 = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
+        .filterBounds(area) \
+        .filterDate('2020-01-01', '2023-12-31') \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 5)) \
+        .select(['B8', 'B4']) \
+        .median()
+
+    return s2.normalizedDifference(['B8', 'B4']).rename('ndvi')
+
+def land_cover_image(area):
+    """Green (NDVI > 0.4) and barren (NDVI < 0.2) masks."""
+    ndvi = ndvi_image(area)
+    return ndvi.gt(0.4).rename('green').addBands(ndvi.lt(0.2).rename('barren'))
+
+def terrain_image():
+    """Soil texture class and slope as one two-band image."""
+    ee = get_ee()
+    soil = ee.Image(SOIL_TEXTURE_IMAGE).select('b0').rename('soil')
+    slope = ee.Terrain.slope(ee.Image(ELEVATION_IMAGE)).rename('slope')
+    return soil.addBands(slope)
+
+def tile_image(area):
+    """NDVI, slope and soil bands exported to the local tile store (see tiles.py)."""
+    return ndvi_image(area).addBands(terrain_image()).unmask(tiles.NODATA)
+
+@single_flight(lambda lat, lon, radius=GREEN_RADIUS: ("earthengine", *quantize(lat, lon), radius))
+def fetch_site_layers(lat, lon, radius=GREEN_RADIUS):
+    """Evaluates every Earth Engine layer the water and green assessments need in one call.
+
+    Soil and slope are reduced at the point, green and barren coverage over
+    the `radius` buffer, and both reductions are merged server-side so a
+    single getInfo round-trip returns {"soil", "slope", "green", "barren"}.
+    Sites covered by the local tile store are computed locally instead.
+    """
+    with span("tile_layers"):
+        layers = tiles.local_site_layers(lat, lon, radius)
+    if layers is not None:
+        return layers
+
+    print("\n🌿 Fetching Sentinel-2 Land Cover Data (Updated)...")
+    ee = get_ee()
+    point = ee.Geometry.Point([lon, lat])
+    area = point.buffer(radius)
+
+    point_stats = terrain_image().reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=point,
+        scale=30
+    )
+    area_stats = land_cover_image(area).reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=area,
+        scale=30,
+        maxPixels=1e9
+    )
+    with span("ee_getinfo"):
+        stats = ee.Dictionary(point_stats).combine(area_stats).getInfo()
+    return {band: stats.get(band) for band in ("soil", "slope", "green", "barren")}
+
+def fetch_site_layers_batch(points, radius=GREEN_RADIUS):
+    """fetch_site_layers for many (lat, lon) points with one getInfo per EE_BATCH_SIZE points.
+
+    The points (and their buffers) are packed into FeatureCollections and
+    reduced with reduceRegions over a single Sentinel-2 composite covering
+    all of them. Sites covered by the local tile store skip Earth Engine.
+    Returns layer dicts in the same order as `points`.
+    """
+    with span("tile_layers_batch"):
+        results = [tiles.local_site_layers(lat, lon, radius) for lat, lon in points]
+    misses = [i for i, layers in enumerate(results) if layers is None]
+    if not misses:
+        return results
+
+    ee = get_ee()
+
+    for offset in range(0, len(misses), EE_BATCH_SIZE):
+        chunk_indexes = misses[offset:offset + EE_BATCH_SIZE]
+        chunk = [points[i] for i in chunk_indexes]
+        sites = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([lon, lat]), {"site": i}) for i, (lat, lon) in enumerate(chunk)
+        ])
+        buffers = sites.map(lambda site: site.buffer(radius))
+
+        point_stats = terrain_image().reduceRegions(
+            collection=sites,
             reducer=ee.Reducer.mean(),
-            geometry=ee.Geometry.Point([lon, lat]),
             scale=30
-        ).get('slope').getInfo()
-    
-    return min(slope / 45, 1.0) if slope else 0.0
+        ).select(["site", "soil", "slope"], None, False)
+        area_stats = land_cover_image(buffers.geometry().bounds()).reduceRegions(
+            collection=buffers,
+            reducer=ee.Reducer.mean(),
+            scale=30,
+            tileScale=4
+        ).select(["site", "green", "barren"], None, False)
+
+        with span("ee_batch_getinfo"):
+            stats = ee.Dictionary({"point": point_stats, "area": area_stats}).getInfo()
+        layers = [{"soil": None, "slope": None, "green": None, "barren": None} for _ in chunk]
+        for feature in stats["point"]["features"] + stats["area"]["features"]:
+            properties = feature["properties"]
+            site = layers[properties.pop("site")]
+            site.update((band, value) for band, value in properties.items() if band in site)
+        for i, site_layers in zip(chunk_indexes, layers):
+            results[i] = site_layers
+
+    return results
 
-def calculate_water_harvesting_score(lat, lon):
+def calculate_water_harvesting_score(lat, lon, layers=None):
+    if layers is None:
+        layers = fetch_site_layers(lat, lon)
     rainfall_score = get_rainfall_score(lat, lon)
-    soil_score = get_soil_score(lat, lon)
-    slope_score = get_slope_score(lat, lon)
 
+    return combine_water_scores(rainfall_score, soil_score(layers["soil"]), slope_score(layers["slope"]))
+
+def combine_water_scores(rainfall_score, soil_score, slope_score):
     return {
         "rainfall_score": f"{round((rainfall_score), 3)}",
         "soil_score": f"{round((soil_score), 3)}",
@@ -68,15 +193,16 @@ def calculate_water_harvesting_score(lat, lon):
 
 from fastapi import HTTPException
 
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
-def calculate_afforestation_feasibility(lat: float, lon: float) -> Dict[str, Union[str, bool]]:
+def calculate_afforestation_feasibility(lat: float, lon: float, layers: Optional[Dict] = None) -> Dict[str, Union[str, bool]]:
     """
     Calculate afforestation feasibility based on land cover analysis.
     
     Args:
         lat: Latitude coordinate (float)
         lon: Longitude coordinate (float)
+        layers: Result of fetch_site_layers, fetched here when not given
         
     Returns:
         Dictionary containing:
@@ -87,37 +213,10 @@ def calculate_afforestation_feasibility(lat: float, lon: float) -> Dict[str, Uni
         - message: Additional information
     """
     try:
-        print("\n🌿 Fetching Sentinel-2 Land Cover Data (Updated)...")
-        radius = 5000  # 5km radius
-
-        # Original processing logic
-        s2 = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED") \
-            .filterBounds(ee.Geometry.Point([lon, lat]).buffer(radius)) \
-            .filterDate('2020-01-01', '2023-12-31') \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 5)) \
-            .select(['B8', 'B4']) \
-            .median()
-
-        ndvi = s2.normalizedDifference(['B8', 'B4']).rename('NDVI')
-        green_zone = ndvi.gt(0.4)
-        barren_zone = ndvi.lt(0.2)
-        green_buffer = green_zone.focal_max(radius=500, units='meters')
-        afforestation_area = barren_zone.And(green_buffer)
-
-        # Get coverage data
-        green_coverage = green_zone.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=ee.Geometry.Point([lon, lat]).buffer(radius),
-            scale=30,
-            maxPixels=1e9
-        ).get('NDVI').getInfo()
-
-        barren_coverage = barren_zone.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=ee.Geometry.Point([lon, lat]).buffer(radius),
-            scale=30,
-            maxPixels=1e9
-        ).get('NDVI').getInfo()
+        if layers is None:
+            layers = fetch_site_layers(lat, lon)
+        green_coverage = layers["green"]
+        barren_coverage = layers["barren"]
 
         if green_coverage is None or barren_coverage is None:
             return {
@@ -144,11 +243,14 @@ def calculate_afforestation_feasibility(lat: float, lon: float) -> Dict[str, Uni
         }
 
     except Exception as e:
-        return {
-            "status": "error",
-            "message": str(e),
-            "green_coverage": "0.00",
-            "barren_coverage": "0.00",
-            "is_feasible": False,
-            "suggestion": "Try reducing the analysis radius"
-        }
\ No newline at end of file
+        return afforestation_error(str(e))
+
+def afforestation_error(message: str):
+    return {
+        "status": "error",
+        "message": message,
+        "green_coverage": "0.00",
+        "barren_coverage": "0.00",
+        "is_feasible": False,
+        "suggestion": "Try reducing the analysis radius"
+    }
\ No newline at end of file
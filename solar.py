@@ -1,99 +1,389 @@
-from typing import Dict, Optional
-import requests
+from typing import TYPE_CHECKING, List, Optional
+import argparse
 import pickle
+import numpy as np
 import pandas as pd
 import os
-from sklearn.ensemble import RandomForestRegressor
-from pydantic import BaseModel
+import time
+from pydantic import BaseModel, Field
 
-# Caching
-solar_data_cache: Dict[str, pd.DataFrame] = {}  # Cache for solar data per lat/lon
-model_cache: Dict[str, RandomForestRegressor] = {}  # Cache models per lat/lon
+import cache
+import executors
+from metrics import span, timed
+from power import fetch_series, snap_to_grid
+from singleflight import single_flight
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import RandomForestRegressor
+
+# Caching, bounded by memory (see cache.py); models are also kept on disk
+solar_data_cache = cache.namespace("solar-data", max_mb=128)  # Daily series per grid cell
+model_cache = cache.namespace("solar-model", max_mb=512)  # Trained RandomForests per grid cell
+climatology_cache = cache.namespace("solar-climatology", max_mb=16)  # Day-of-year lookup tables per grid cell
 
-NASA_API_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
 MODEL_DIR = "models"
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# "forest": one RandomForest per POWER grid cell, trained on first request
+# "global": one model trained offline over a grid of locations (see train_global_model)
+# "climatology": per-cell day-of-year mean table, no model training
+SOLAR_ENGINE = os.getenv("SOLAR_ENGINE", "forest")
+GLOBAL_MODEL_PATH = os.path.join(MODEL_DIR, "global_solar.pkl")
+GLOBAL_FEATURES = ['Latitude', 'Longitude', 'Year', 'Month', 'DayOfYear', 'TOA_Radiation']
+global_model: Optional["RandomForestRegressor"] = None
+
+def random_forest(**params) -> "RandomForestRegressor":
+    # sklearn takes seconds to import, so it is only loaded once a model is trained
+    from sklearn.ensemble import RandomForestRegressor
+    return RandomForestRegressor(random_state=42, **params)
+
 class SolarInput(BaseModel):
     latitude: float
     longitude: float
     year: Optional[int] = 2025
     month: Optional[int] = 1
+    engine: Optional[str] = None  # Defaults to SOLAR_ENGINE
+
+class SolarLocation(BaseModel):
+    latitude: float
+    longitude: float
+
+class SolarBatchInput(BaseModel):
+    locations: List[SolarLocation]
+    start_year: int = 2025
+    start_month: int = Field(1, ge=1, le=12)
+    end_year: int = 2025
+    end_month: int = Field(12, ge=1, le=12)
+    engine: Optional[str] = None  # Defaults to SOLAR_ENGINE
+
+# Upper bound on locations x months in one batch request
+SOLAR_BATCH_MAX_ROWS = int(os.getenv("SOLAR_BATCH_MAX_ROWS", "100000"))
 
 def fetch_nasa_data(lat: float, lon: float):
-    cache_key = f"{lat},{lon}"
-    if cache_key in solar_data_cache:
-        return solar_data_cache[cache_key]
+    cache_key = "{},{}".format(*snap_to_grid(lat, lon))
+    df = solar_data_cache.get(cache_key)
+    if df is not None:
+        return df
     
-    params = {
-        "parameters": "ALLSKY_SFC_SW_DWN",
-        "community": "RE",
-        "longitude": lon,
-        "latitude": lat,
-        "start": "20100101",
-        "end": "20241231",
-        "format": "JSON"
-    }
-    response = requests.get(NASA_API_URL, params=params)
-    if response.status_code != 200:
-        return None
+    with span("solar_series"):
+        values = fetch_series(lat, lon, "ALLSKY_SFC_SW_DWN", start="20100101", end="20241231")
+        if values is None:
+            return None
+        
+        dates = pd.DatetimeIndex(values.dates)
+        df = pd.DataFrame({
+            'Date': dates,
+            'Solar_Radiation': np.maximum(values.values, 0),
+            'Year': dates.year,
+            'Month': dates.month,
+            'DayOfYear': dates.dayofyear,
+        })
     
-    data = response.json()
-    values = data['properties']['parameter']['ALLSKY_SFC_SW_DWN']
-    df = pd.DataFrame(list(values.items()), columns=['Date', 'Solar_Radiation'])
-    df['Date'] = pd.to_datetime(df['Date'], format='%Y%m%d')
-    df['Year'] = df['Date'].dt.year
-    df['Month'] = df['Date'].dt.month
-    df['DayOfYear'] = df['Date'].dt.dayofyear
-    df['Solar_Radiation'] = df['Solar_Radiation'].apply(lambda x: max(0, x))
-    
-    solar_data_cache[cache_key] = df
+    solar_data_cache.set(cache_key, df)
     return df
 
+def train_model(X: pd.DataFrame, y: pd.Series, model_path: str):
+    """Fits a per-cell RandomForest and pickles it to model_path; runs in the CPU pool."""
+    model = random_forest(n_estimators=200, max_depth=10)
+    model.fit(X, y)
+
+    tmp_path = f"{model_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(model, f)
+    os.replace(tmp_path, model_path)
+
+def _load_model(cache_key: str, model_path: str):
+    with span("solar_model_load"), open(model_path, "rb") as f:
+        model = pickle.load(f)
+    # The pickle's size is a fair estimate of the model's and saves re-pickling it
+    model_cache.set(cache_key, model, size=os.path.getsize(model_path))
+    return model
+
+# Concurrent first requests for a cell train (and pickle) the model only once
+@single_flight(lambda lat, lon: ("solar-model", *snap_to_grid(lat, lon)))
 def get_model(lat: float, lon: float):
-    cache_key = f"{lat},{lon}"
+    # Every point in a POWER grid cell trains on the same series
+    cache_key = "{},{}".format(*snap_to_grid(lat, lon))
     model_path = os.path.join(MODEL_DIR, f"{cache_key}.pkl")
     
-    if cache_key in model_cache:
-        return model_cache[cache_key]
+    model = model_cache.get(cache_key)
+    if model is not None:
+        return model
     
     if os.path.exists(model_path):
-        with open(model_path, "rb") as f:
-            model = pickle.load(f)
-            model_cache[cache_key] = model
-            return model
+        return _load_model(cache_key, model_path)
     
     df = fetch_nasa_data(lat, lon)
     if df is None:
         return None
     
     X, y = df[['Year', 'Month', 'DayOfYear']], df['Solar_Radiation']
-    model = RandomForestRegressor(n_estimators=200, max_depth=10, random_state=42)
-    model.fit(X, y)
+    with span("solar_train"):
+        # In a worker process, so training doesn't hold the API process's GIL
+        executors.cpu.call(train_model, X, y, model_path)
     
-    with open(model_path, "wb") as f:
+    return _load_model(cache_key, model_path)
+
+def build_climatology(df: pd.DataFrame, window: int = 15) -> np.ndarray:
+    """Mean radiation per day of year, smoothed over a centred `window`-day circle.
+
+    Returns an array indexed by DayOfYear (1..366; index 0 is unused).
+    """
+    by_day = df.groupby('DayOfYear')['Solar_Radiation'].mean().reindex(range(1, 367))
+    daily = by_day.interpolate(limit_direction='both').to_numpy()
+    half = window // 2
+    padded = np.concatenate([daily[-half:], daily, daily[:half]])
+    smoothed = np.convolve(padded, np.ones(window) / window, mode='valid')
+    return np.concatenate([[np.nan], smoothed])
+
+@single_flight(lambda lat, lon: ("solar-climatology", *snap_to_grid(lat, lon)))
+def get_climatology(lat: float, lon: float) -> Optional[np.ndarray]:
+    cache_key = "{},{}".format(*snap_to_grid(lat, lon))
+    table = climatology_cache.get(cache_key)
+    if table is not None:
+        return table
+
+    df = fetch_nasa_data(lat, lon)
+    if df is None:
+        return None
+
+    with span("solar_climatology"):
+        table = build_climatology(df)
+    climatology_cache.set(cache_key, table)
+    return table
+
+def compare_engines(lat: float, lon: float, holdout_year: int = 2024, repeats: int = 200):
+    """Compares the RandomForest and climatology engines on one held-out year.
+
+    Both are fitted on the years before `holdout_year` and scored on every day
+    of it. Returns MAE (kWh/m²), fit time and single-prediction latency (s).
+    """
+    df = fetch_nasa_data(lat, lon)
+    if df is None:
+        raise RuntimeError(f"No POWER data for {lat},{lon}")
+    train, test = df[df['Year'] < holdout_year], df[df['Year'] == holdout_year]
+    features = ['Year', 'Month', 'DayOfYear']
+    one_row = test[features].iloc[[0]]
+    one_day = int(one_row['DayOfYear'].iloc[0])
+
+    start = time.perf_counter()
+    model = random_forest(n_estimators=200, max_depth=10)
+    model.fit(train[features], train['Solar_Radiation'])
+    forest_fit = time.perf_counter() - start
+    forest_mae = np.abs(model.predict(test[features]) - test['Solar_Radiation']).mean()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(one_row)
+    forest_predict = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    table = build_climatology(train)
+    climatology_fit = time.perf_counter() - start
+    climatology_mae = np.abs(table[test['DayOfYear'].to_numpy()] - test['Solar_Radiation']).mean()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        table[one_day]
+    climatology_predict = (time.perf_counter() - start) / repeats
+
+    return {
+        "forest": {"mae": float(forest_mae), "fit_s": forest_fit, "predict_s": forest_predict},
+        "climatology": {"mae": float(climatology_mae), "fit_s": climatology_fit, "predict_s": climatology_predict},
+    }
+
+def toa_radiation(lat, day_of_year):
+    """Daily top-of-atmosphere radiation in kWh/m² (FAO-56 eq. 21).
+
+    A closed-form climatology of how much sunlight a latitude can get on a
+    given day, which lets one model generalise across locations.
+    """
+    phi = np.radians(lat)
+    angle = 2 * np.pi * np.asarray(day_of_year) / 365
+    dr = 1 + 0.033 * np.cos(angle)
+    delta = 0.409 * np.sin(angle - 1.39)
+    ws = np.arccos(np.clip(-np.tan(phi) * np.tan(delta), -1.0, 1.0))
+    ra = (24 * 60 / np.pi) * 0.0820 * dr * (
+        ws * np.sin(phi) * np.sin(delta) + np.cos(phi) * np.cos(delta) * np.sin(ws)
+    )
+    return ra / 3.6  # MJ/m² -> kWh/m²
+
+def global_features(lat, lon, year, month, day_of_year) -> pd.DataFrame:
+    X = pd.DataFrame({
+        'Latitude': lat,
+        'Longitude': lon,
+        'Year': year,
+        'Month': month,
+        'DayOfYear': day_of_year,
+    })
+    X['TOA_Radiation'] = toa_radiation(X['Latitude'], X['DayOfYear'])
+    return X[GLOBAL_FEATURES]
+
+def grid_locations(lat_min: float, lon_min: float, lat_max: float, lon_max: float, step: float):
+    for lat in np.arange(lat_min, lat_max + 1e-9, step):
+        for lon in np.arange(lon_min, lon_max + 1e-9, step):
+            yield round(float(lat), 4), round(float(lon), 4)
+
+def train_global_model(locations, sample_every: int = 3, n_estimators: int = 200, max_depth: int = 16):
+    """Trains one solar model over many locations and saves it to GLOBAL_MODEL_PATH.
+
+    Meant to run offline (python solar.py --train-global ...). Every
+    `sample_every`-th day of each location is used to keep the training set small.
+    """
+    frames = []
+    for lat, lon in locations:
+        df = fetch_nasa_data(lat, lon)
+        if df is None:
+            print(f"Skipping {lat},{lon}: no POWER data")
+            continue
+        df = df.iloc[::sample_every]
+        frames.append(global_features(lat, lon, df['Year'], df['Month'], df['DayOfYear']).assign(
+            Solar_Radiation=df['Solar_Radiation'].to_numpy()
+        ))
+    if not frames:
+        raise RuntimeError("No training data could be fetched for the requested locations.")
+
+    train = pd.concat(frames, ignore_index=True)
+    print(f"Training global solar model on {len(train)} rows from {len(frames)} locations")
+    model = random_forest(n_estimators=n_estimators, max_depth=max_depth, n_jobs=-1)
+    model.fit(train[GLOBAL_FEATURES], train['Solar_Radiation'])
+
+    tmp_path = f"{GLOBAL_MODEL_PATH}.tmp"
+    with open(tmp_path, "wb") as f:
         pickle.dump(model, f)
-    
-    model_cache[cache_key] = model
+    os.replace(tmp_path, GLOBAL_MODEL_PATH)
     return model
 
-def predict_solar(input_data: SolarInput):
-    model = get_model(input_data.latitude, input_data.longitude)
-    if model is None:
-        return {"message": "Failed to fetch or train model."}
-    
-    day_of_year = pd.Timestamp(year=input_data.year, month=input_data.month, day=15).dayofyear
-    X_pred = pd.DataFrame([[input_data.year, input_data.month, day_of_year]], columns=['Year', 'Month', 'DayOfYear'])
-    prediction = model.predict(X_pred)[0]
-    
+def load_global_model():
+    """Loads the pre-trained global model; called once at startup."""
+    global global_model
+    if global_model is None and os.path.exists(GLOBAL_MODEL_PATH):
+        with open(GLOBAL_MODEL_PATH, "rb") as f:
+            global_model = pickle.load(f)
+    return global_model
+
+def solar_recommendation(prediction: float) -> str:
     if prediction > 5.0:
-            recommendation = "✅ Excellent potential! Installing solar is a great investment."
+        return "✅ Excellent potential! Installing solar is a great investment."
     elif 3.5 <= prediction <= 5.0:
-        recommendation = "👍 Good potential. Solar installation is beneficial."
+        return "👍 Good potential. Solar installation is beneficial."
     elif 2.0 <= prediction < 3.5:
-        recommendation = "⚠️ Moderate potential. Consider additional analysis before installation."
+        return "⚠️ Moderate potential. Consider additional analysis before installation."
     else:
-        recommendation = "❌ Low potential. Solar may not be a cost-effective option."
+        return "❌ Low potential. Solar may not be a cost-effective option."
 
+def resolve_engine(engine: Optional[str]) -> str:
+    engine = engine or SOLAR_ENGINE
+    if engine == "global" and load_global_model() is None:
+        print(f"Global solar model not found at {GLOBAL_MODEL_PATH}, falling back to per-location model")
+        engine = "forest"
+    return engine
+
+@timed("solar_predict")
+def predict_solar(input_data: SolarInput):
+    engine = resolve_engine(input_data.engine)
+    day_of_year = pd.Timestamp(year=input_data.year, month=input_data.month, day=15).dayofyear
+
+    if engine == "global":
+        X_pred = global_features(
+            [input_data.latitude], [input_data.longitude], [input_data.year], [input_data.month], [day_of_year]
+        )
+        prediction = global_model.predict(X_pred)[0]
+    elif engine == "forest":
+        model = get_model(input_data.latitude, input_data.longitude)
+        if model is None:
+            return {"message": "Failed to fetch or train model."}
+
+        X_pred = pd.DataFrame([[input_data.year, input_data.month, day_of_year]], columns=['Year', 'Month', 'DayOfYear'])
+        prediction = model.predict(X_pred)[0]
+    elif engine == "climatology":
+        table = get_climatology(input_data.latitude, input_data.longitude)
+        if table is None:
+            return {"message": "Failed to fetch solar data."}
+        prediction = table[day_of_year]
+    else:
+        return {"message": f"Unknown solar engine '{engine}'."}
+    
+    recommendation = solar_recommendation(prediction)
     
     return {"value": f"{max(0, round(prediction, 3))} kWh/m²", "result": recommendation}
+
+@timed("solar_predict_batch")
+def predict_solar_batch(input_data: SolarBatchInput):
+    """Predicts solar potential for every location x month in the request.
+
+    Rows are grouped by the model that serves them (one per grid cell for the
+    per-location engines, a single group for "global") and each group is
+    predicted with one vectorized call. Returns a columnar dict; "value" is
+    None for locations whose data or model could not be obtained.
+    """
+    engine = resolve_engine(input_data.engine)
+    if engine not in ("global", "forest", "climatology"):
+        raise ValueError(f"Unknown solar engine '{engine}'.")
+
+    months = pd.period_range(
+        pd.Period(year=input_data.start_year, month=input_data.start_month, freq="M"),
+        pd.Period(year=input_data.end_year, month=input_data.end_month, freq="M"),
+        freq="M"
+    )
+    if len(months) == 0:
+        raise ValueError("The start month is after the end month.")
+    n_rows = len(input_data.locations) * len(months)
+    if n_rows > SOLAR_BATCH_MAX_ROWS:
+        raise ValueError(f"Batch has {n_rows} rows, the limit is {SOLAR_BATCH_MAX_ROWS}.")
+
+    lats = np.repeat([loc.latitude for loc in input_data.locations], len(months))
+    lons = np.repeat([loc.longitude for loc in input_data.locations], len(months))
+    rows = pd.DataFrame({
+        'Latitude': lats,
+        'Longitude': lons,
+        'Year': np.tile(months.year, len(input_data.locations)),
+        'Month': np.tile(months.month, len(input_data.locations)),
+    })
+    rows['DayOfYear'] = pd.to_datetime(rows[['Year', 'Month']].assign(Day=15)).dt.dayofyear
+    values = np.full(len(rows), np.nan)
+
+    if engine == "global":
+        X = global_features(rows['Latitude'], rows['Longitude'], rows['Year'], rows['Month'], rows['DayOfYear'])
+        values[:] = global_model.predict(X)
+    else:
+        cells = ["{},{}".format(*snap_to_grid(lat, lon)) for lat, lon in zip(lats, lons)]
+        for _, group in rows.groupby(pd.Series(cells, index=rows.index), sort=False):
+            lat, lon = group['Latitude'].iloc[0], group['Longitude'].iloc[0]
+            if engine == "forest":
+                model = get_model(lat, lon)
+                if model is not None:
+                    values[group.index] = model.predict(group[['Year', 'Month', 'DayOfYear']])
+            else:
+                table = get_climatology(lat, lon)
+                if table is not None:
+                    values[group.index] = table[group['DayOfYear'].to_numpy()]
+
+    values = np.round(np.maximum(values, 0), 3)
+    return {
+        "engine": engine,
+        "unit": "kWh/m²",
+        "latitude": rows['Latitude'].tolist(),
+        "longitude": rows['Longitude'].tolist(),
+        "year": rows['Year'].tolist(),
+        "month": rows['Month'].tolist(),
+        "value": [None if np.isnan(v) else float(v) for v in values],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline tools for the solar engines")
+    parser.add_argument("--train-global", action="store_true", help="Train and save the global model")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--step", type=float, default=1.0, help="Grid spacing in degrees")
+    parser.add_argument("--compare", nargs=2, type=float, metavar=("LAT", "LON"),
+                        help="Compare forest and climatology accuracy/latency at one location")
+    args = parser.parse_args()
+
+    if args.train_global:
+        if args.bbox is None:
+            parser.error("--train-global requires --bbox")
+        train_global_model(grid_locations(*args.bbox, args.step))
+        print(f"Saved global solar model to {GLOBAL_MODEL_PATH}")
+
+    if args.compare:
+        for engine, stats in compare_engines(*args.compare).items():
+            print(f"{engine:12} MAE {stats['mae']:.3f} kWh/m²  fit {stats['fit_s'] * 1e3:9.2f} ms  "
+                  f"predict {stats['predict_s'] * 1e6:9.2f} µs")
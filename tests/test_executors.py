@@ -0,0 +1,25 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import executors
+
+
+def test_shutdown_with_queued_tasks_does_not_deadlock():
+    release = threading.Event()
+    pool = executors.BoundedExecutor("test-shutdown", ThreadPoolExecutor(max_workers=1), max_pending=3)
+    running = pool.submit(release.wait)
+    queued = [pool.submit(release.wait) for _ in range(2)]
+    with pytest.raises(executors.PoolSaturated):
+        pool.submit(release.wait)
+
+    done = threading.Thread(target=pool.shutdown, daemon=True)
+    done.start()
+    done.join(timeout=5)
+    release.set()
+
+    assert not done.is_alive(), "shutdown deadlocked"
+    assert all(future.cancelled() for future in queued)
+    running.result(timeout=5)
+    assert pool.pending == 0
@@ -0,0 +1,92 @@
+import fcntl
+import os
+import time
+
+import pytest
+
+import power
+
+
+def _touch(path, accessed):
+    with open(path, "w"):
+        pass
+    os.utime(path, (accessed, time.time()))
+
+
+def test_evict_cache_removes_lock_files_with_their_cell(tmp_path, monkeypatch):
+    monkeypatch.setattr(power, "POWER_CACHE_DIR", str(tmp_path))
+    now = time.time()
+    _touch(tmp_path / "series_WS10M_19810101_20241231_12.5_77.5.npz", now - 60)
+    _touch(tmp_path / "series_WS10M_19810101_20241231_13.0_78.125.npz", now)
+    for cell in ("12.5_77.5", "13.0_78.125", "-1.0_2.5"):
+        _touch(tmp_path / f"daily_{cell}.lock", now)
+
+    with open(tmp_path / "daily_-1.0_2.5.lock", "w") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        power.evict_cache(max_entries=1)
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "daily_-1.0_2.5.lock",  # Held by a running fetch
+        "daily_13.0_78.125.lock",
+        "series_WS10M_19810101_20241231_13.0_78.125.npz",
+    ]
+
+
+RESPONSE = (
+    '{"type": "Feature", "header": {"title": "NASA/POWER 0.5° x 0.625°", "fill_value": -999.0, '
+    '"parameters": "PRECTOTCORR"}, '
+    '"properties": {"parameter": {"PRECTOTCORR": {"19810101": 1.25, "19810102": -999.0, '
+    '"19810103": 0.0, "19810104": 12.5, "19810105": 1.5e-2, "19810106": -999.0}}}, '
+    '"messages": [], "times": {"data": 1.5, "process": 0.25}}'
+).encode()
+EXPECTED = (1.25 + 0.0 + 12.5 + 0.015, 4)
+
+
+def _sum(chunks):
+    summed = power.SeriesSum("PRECTOTCORR")
+    for chunk in chunks:
+        summed.feed(chunk)
+    total, count = summed.result()
+    return round(total, 9), count
+
+
+def test_series_sum_skips_fill_values():
+    assert _sum([RESPONSE]) == EXPECTED
+
+
+def test_series_sum_any_split_point():
+    # Covers keys, numbers, the fill value and the "°" bytes split across two chunks
+    for i in range(len(RESPONSE) + 1):
+        assert _sum([RESPONSE[:i], RESPONSE[i:]]) == EXPECTED, f"split at byte {i}"
+
+
+def test_series_sum_byte_by_byte():
+    assert _sum([RESPONSE[i:i + 1] for i in range(len(RESPONSE))]) == EXPECTED
+
+
+def test_series_sum_rejects_other_parameter_and_truncated_response():
+    with pytest.raises(ValueError):
+        power.SeriesSum("WS10M").feed(RESPONSE)
+
+    truncated = power.SeriesSum("PRECTOTCORR")
+    truncated.feed(RESPONSE[:RESPONSE.index(b"12.5")])
+    with pytest.raises(ValueError):
+        truncated.result()
+
+
+def test_stream_series_sum_is_cached_per_cell(tmp_path, monkeypatch):
+    monkeypatch.setattr(power, "POWER_CACHE_DIR", str(tmp_path))
+    calls = []
+
+    def get_streamed(url, make_consumer, params=None):
+        calls.append(params)
+        consumer = make_consumer()
+        consumer.feed(RESPONSE)
+        return consumer.result()
+
+    monkeypatch.setattr(power, "get_streamed", get_streamed)
+    first = power.stream_series_sum(12.97, 77.59, "PRECTOTCORR")
+    # Another point in the same grid cell is served from the disk cache
+    assert power.stream_series_sum(13.1, 77.4, "PRECTOTCORR") == first
+    assert len(calls) == 1
+    assert (round(first[0], 9), first[1]) == EXPECTED
@@ -0,0 +1,189 @@
+import argparse
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from earthengine import get_ee
+
+# Local store of static Earth Engine layers. The world is cut into
+# TILE_SIZE_DEG tiles of TILE_PIXELS x TILE_PIXELS (~28 m) pixels, one .npy
+# file per band, north-up. Tiles are memory-mapped, so only the pixels
+# around a site are actually read from disk.
+TILE_DIR = os.getenv("TILE_DIR", "cache/tiles")
+TILE_SIZE_DEG = 0.25
+TILE_PIXELS = 1000
+PIXEL_DEG = TILE_SIZE_DEG / TILE_PIXELS
+TILE_BANDS = ("ndvi", "slope", "soil")
+NODATA = -9999.0
+# Windows spanning more tiles (huge radii, or near the poles where a
+# degree of longitude shrinks to nothing) are left to Earth Engine
+MAX_WINDOW_TILES = int(os.getenv("TILE_MAX_WINDOW_TILES", "16"))
+
+_open_tiles: Dict[Tuple[str, int, int], np.ndarray] = {}
+
+METERS_PER_DEG = 111320.0
+
+
+def tile_index(lat: float, lon: float) -> Tuple[int, int]:
+    return math.floor(lat / TILE_SIZE_DEG), math.floor(lon / TILE_SIZE_DEG)
+
+
+def tile_path(band: str, ty: int, tx: int) -> str:
+    return os.path.join(TILE_DIR, f"{band}_{ty}_{tx}.npy")
+
+
+def has_tile(ty: int, tx: int) -> bool:
+    return all(os.path.exists(tile_path(band, ty, tx)) for band in TILE_BANDS)
+
+
+def load_tile(band: str, ty: int, tx: int) -> Optional[np.ndarray]:
+    key = (band, ty, tx)
+    if key not in _open_tiles:
+        path = tile_path(band, ty, tx)
+        if not os.path.exists(path):
+            return None
+        _open_tiles[key] = np.load(path, mmap_mode="r")
+    return _open_tiles[key]
+
+
+def _pixel(lat: float, lon: float) -> Tuple[int, int]:
+    """Global (row, col) of the pixel containing (lat, lon); row 0 is at 90°N."""
+    return math.floor((90.0 - lat) / PIXEL_DEG), math.floor((lon + 180.0) / PIXEL_DEG)
+
+
+def read_window(band: str, row_min: int, row_max: int, col_min: int, col_max: int) -> Optional[np.ndarray]:
+    """Assembles global pixel rows/cols [min, max] of a band from the tiles covering them.
+
+    Returns None if any of those tiles is not in the store, or if the window
+    spans more than MAX_WINDOW_TILES tiles.
+    """
+    tiles_north_of_equator = round(90.0 / TILE_SIZE_DEG)
+    tiles_west_of_meridian = round(180.0 / TILE_SIZE_DEG)
+    tile_rows = range(row_min // TILE_PIXELS, row_max // TILE_PIXELS + 1)
+    tile_cols = range(col_min // TILE_PIXELS, col_max // TILE_PIXELS + 1)
+    if len(tile_rows) * len(tile_cols) > MAX_WINDOW_TILES:
+        return None
+
+    # Check coverage before allocating the window
+    tiles = {}
+    for tile_row in tile_rows:
+        for tile_col in tile_cols:
+            ty = tiles_north_of_equator - 1 - tile_row
+            tx = tile_col - tiles_west_of_meridian
+            tile = load_tile(band, ty, tx)
+            if tile is None:
+                return None
+            tiles[tile_row, tile_col] = tile
+
+    out = np.empty((row_max - row_min + 1, col_max - col_min + 1), dtype=np.float32)
+    for (tile_row, tile_col), tile in tiles.items():
+        r0 = max(row_min, tile_row * TILE_PIXELS)
+        r1 = min(row_max, (tile_row + 1) * TILE_PIXELS - 1)
+        c0 = max(col_min, tile_col * TILE_PIXELS)
+        c1 = min(col_max, (tile_col + 1) * TILE_PIXELS - 1)
+        out[r0 - row_min:r1 - row_min + 1, c0 - col_min:c1 - col_min + 1] = tile[
+            r0 - tile_row * TILE_PIXELS:r1 - tile_row * TILE_PIXELS + 1,
+            c0 - tile_col * TILE_PIXELS:c1 - tile_col * TILE_PIXELS + 1
+        ]
+    return out
+
+
+def local_site_layers(lat: float, lon: float, radius: float) -> Optional[dict]:
+    """Computes fetch_site_layers' values from the local tiles.
+
+    Soil and slope are the pixel values at the point; green and barren are
+    the fractions of valid NDVI pixels within `radius` metres above 0.4 and
+    below 0.2. Returns None when a needed tile is missing.
+    """
+    row, col = _pixel(lat, lon)
+    point = {}
+    for band in ("soil", "slope"):
+        value = read_window(band, row, row, col, col)
+        if value is None:
+            return None
+        value = float(value[0, 0])
+        point[band] = None if value == NODATA or np.isnan(value) else value
+
+    half_rows = math.ceil(radius / METERS_PER_DEG / PIXEL_DEG)
+    half_cols = math.ceil(radius / (METERS_PER_DEG * max(math.cos(math.radians(lat)), 1e-6)) / PIXEL_DEG)
+    ndvi = read_window("ndvi", row - half_rows, row + half_rows, col - half_cols, col + half_cols)
+    if ndvi is None:
+        return None
+
+    dy = np.arange(-half_rows, half_rows + 1)[:, None] * PIXEL_DEG * METERS_PER_DEG
+    dx = np.arange(-half_cols, half_cols + 1)[None, :] * PIXEL_DEG * METERS_PER_DEG * math.cos(math.radians(lat))
+    in_circle = dy ** 2 + dx ** 2 <= radius ** 2
+    values = ndvi[in_circle & (ndvi != NODATA) & ~np.isnan(ndvi)]
+
+    if values.size == 0:
+        green = barren = None
+    else:
+        green = float(np.mean(values > 0.4))
+        barren = float(np.mean(values < 0.2))
+    return {"soil": point["soil"], "slope": point["slope"], "green": green, "barren": barren}
+
+
+def export_tile(ty: int, tx: int, image):
+    """Downloads one tile of `image` (bands named as TILE_BANDS) from Earth Engine.
+
+    Masked pixels must already be unmasked to NODATA. Each band is written
+    to a temp file and renamed into place, so readers never see partial tiles.
+    """
+    ee = get_ee()
+
+    pixels = ee.data.computePixels({
+        "expression": image.select(list(TILE_BANDS)).toFloat(),
+        "fileFormat": "NUMPY_NDARRAY",
+        "grid": {
+            "dimensions": {"width": TILE_PIXELS, "height": TILE_PIXELS},
+            "affineTransform": {
+                "scaleX": PIXEL_DEG,
+                "shearX": 0,
+                "translateX": tx * TILE_SIZE_DEG,
+                "shearY": 0,
+                "scaleY": -PIXEL_DEG,
+                "translateY": (ty + 1) * TILE_SIZE_DEG,
+            },
+            "crsCode": "EPSG:4326",
+        },
+    })
+
+    os.makedirs(TILE_DIR, exist_ok=True)
+    for band in TILE_BANDS:
+        path = tile_path(band, ty, tx)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(pixels[band], dtype=np.float32))
+        os.replace(tmp_path, path)
+
+
+def prefetch(lat_min: float, lon_min: float, lat_max: float, lon_max: float, image_for_area, margin: float = 5000):
+    """Exports every missing tile covering the bbox plus `margin` metres around it."""
+    ee = get_ee()
+
+    pad_lat = margin / METERS_PER_DEG
+    pad_lon = margin / (METERS_PER_DEG * max(math.cos(math.radians(max(abs(lat_min), abs(lat_max)))), 1e-6))
+    ty_min, tx_min = tile_index(lat_min - pad_lat, lon_min - pad_lon)
+    ty_max, tx_max = tile_index(lat_max + pad_lat, lon_max + pad_lon)
+
+    for ty in range(ty_min, ty_max + 1):
+        for tx in range(tx_min, tx_max + 1):
+            if has_tile(ty, tx):
+                continue
+            area = ee.Geometry.Rectangle([
+                tx * TILE_SIZE_DEG, ty * TILE_SIZE_DEG, (tx + 1) * TILE_SIZE_DEG, (ty + 1) * TILE_SIZE_DEG
+            ])
+            print(f"Exporting tile {ty},{tx}")
+            export_tile(ty, tx, image_for_area(area))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prefetch Earth Engine layer tiles into the local store")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"), required=True)
+    args = parser.parse_args()
+
+    from soil import tile_image
+
+    prefetch(*args.bbox, image_for_area=tile_image)
@@ -0,0 +1,174 @@
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+from typing import Optional
+
+import httpx
+
+from metrics import span
+
+# Shared HTTP client for every upstream fetch (NASA POWER, Overpass).
+# One pooled, keep-alive httpx.AsyncClient lives on a dedicated event loop
+# thread; sync callers (the fetch functions run in worker threads) and async
+# callers both submit their requests to that loop, so connections are reused
+# across the whole process.
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "90"))  # Seconds per attempt
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "10"))
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "3"))
+# Hard cap on one call, all attempts and backoff included
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", "150"))
+UPSTREAM_BACKOFF_BASE = 0.5  # Seconds; doubled per attempt
+UPSTREAM_BACKOFF_MAX = 20.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Max concurrent requests per host, across the whole process (API requests and
+# bulk screening alike); the only concurrency cap for these upstreams
+HOST_LIMITS = {
+    "power.larc.nasa.gov": int(os.getenv("POWER_HOST_LIMIT", "8")),
+    "overpass-api.de": int(os.getenv("OVERPASS_HOST_LIMIT", "2")),
+}
+DEFAULT_HOST_LIMIT = 4
+
+# Short names used as metrics stages ("http_power", ...)
+HOST_NAMES = {
+    "power.larc.nasa.gov": "power",
+    "overpass-api.de": "overpass",
+}
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[httpx.AsyncClient] = None
+_transport: Optional[httpx.AsyncBaseTransport] = None  # Set by use_transport
+_host_slots = {}
+_start_lock = threading.Lock()
+
+
+class UpstreamError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _start_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="upstream-http", daemon=True).start()
+    return _loop
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Only called on the upstream loop, so no locking is needed
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            transport=_transport,
+            # HTTP/2 needs the optional h2 package; fall back to pooled HTTP/1.1
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+            follow_redirects=True
+        )
+    return _client
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), UPSTREAM_BACKOFF_MAX)
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def _request(method: str, url: str, read, params=None, data=None):
+    """Sends a request with retries and returns `await read(response)` for the 200 response.
+
+    The body is streamed, so `read` decides whether to buffer it or consume
+    it incrementally. Retries cover timeouts and connection errors (also
+    mid-body) and 429/5xx responses.
+    """
+    client = _get_client()
+    host = httpx.URL(url).host
+    if host not in _host_slots:
+        _host_slots[host] = asyncio.Semaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        response = None
+        try:
+            async with _host_slots[host]:
+                with span(f"http_{HOST_NAMES.get(host, host)}"):
+                    async with client.stream(method, url, params=params, data=data) as response:
+                        if response.status_code == 200:
+                            return await read(response)
+                        if response.status_code not in RETRY_STATUSES:
+                            raise UpstreamError(f"{host} returned {response.status_code}", response.status_code)
+            error = UpstreamError(f"{host} returned {response.status_code}", response.status_code)
+        except httpx.TransportError as e:
+            error = UpstreamError(f"{host} request failed: {e!r}")
+
+        if attempt == UPSTREAM_RETRIES:
+            raise error
+        await asyncio.sleep(_backoff(attempt, response))
+
+
+async def _read_json(response: httpx.Response):
+    await response.aread()
+    return response.json()
+
+
+async def _with_deadline(url: str, coro):
+    try:
+        return await asyncio.wait_for(coro, UPSTREAM_DEADLINE)
+    except asyncio.TimeoutError:
+        raise UpstreamError(f"{httpx.URL(url).host} gave no result within {UPSTREAM_DEADLINE:g}s") from None
+
+
+def _submit(url: str, coro):
+    return asyncio.run_coroutine_threadsafe(_with_deadline(url, coro), _get_loop())
+
+
+def get_json(url: str, params=None):
+    """GETs `url` and returns the decoded JSON body; blocks the calling thread.
+
+    Retries timeouts, connection errors and 429/5xx responses with jittered
+    exponential backoff. Raises UpstreamError once retries are exhausted,
+    after UPSTREAM_DEADLINE seconds in total, or on any other non-200 response.
+    """
+    return _submit(url, _request("GET", url, _read_json, params=params)).result()
+
+
+def get_streamed(url: str, make_consumer, params=None):
+    """GETs `url` and feeds the body to a consumer chunk by chunk, never buffering it whole.
+
+    `make_consumer()` must return an object with feed(bytes) and result();
+    a fresh one is created for every attempt. Returns consumer.result().
+    """
+    async def read(response: httpx.Response):
+        consumer = make_consumer()
+        async for chunk in response.aiter_bytes():
+            consumer.feed(chunk)
+        return consumer.result()
+
+    return _submit(url, _request("GET", url, read, params=params)).result()
+
+
+def close():
+    """Closes the pooled connections; called on app shutdown."""
+    global _client
+    if _loop is None or _client is None:
+        return
+    asyncio.run_coroutine_threadsafe(_client.aclose(), _loop).result()
+    _client = None
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]):
+    """Sends every upstream request through `transport` instead of the network.
+
+    Used by the benchmarks to serve recorded responses with an
+    httpx.MockTransport; pass None to go back to real connections.
+    """
+    global _transport
+    close()
+    _transport = transport
@@ -1,80 +1,111 @@
-import requests
+import numpy as np
 import pandas as pd
 
-def fetch_nasa_wind_data(lat, lon, start_year=2011, end_year=2022):
-    base_url = "https://power.larc.nasa.gov/api/temporal/monthly/point"
-    params = {
-        "parameters": "WS10M",
-        "community": "RE",
-        "longitude": lon,
-        "latitude": lat,
-        "start": start_year,
-        "end": end_year,
-        "format": "JSON"
-    }
+from metrics import timed
+from power import fetch_series
+from singleflight import single_flight, quantize
+from upstream import get_json, UpstreamError
 
-    response = requests.get(base_url, params=params)
-    if response.status_code != 200:
-        return None
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 
-    data = response.json()
-    wind_speeds = data['properties']['parameter']['WS10M']
+@timed("wind_series")
+def fetch_nasa_wind_data(lat, lon, start_year=2011, end_year=2022):
+    daily = fetch_series(lat, lon, "WS10M", start=f"{start_year}0101", end=f"{end_year}1231")
+    if daily is None:
+        return None
+    months, wind_speeds = daily.monthly_means()
     
-    df = pd.DataFrame(list(wind_speeds.items()), columns=['YearMonth', 'WindSpeed'])
-    df['Year'] = df['YearMonth'].str[:4].astype(int)
+    df = pd.DataFrame({
+        'YearMonth': np.char.replace(np.datetime_as_string(months), '-', ''),
+        'WindSpeed': wind_speeds,
+        'Year': months.astype('datetime64[Y]').astype(int) + 1970,
+    })
 
     return df
 
-def fetch_osm_landuse(lat, lon, radius=5000):
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    query = f"""
-    [out:json];
-    way(around:{radius},{lat},{lon})["landuse"];
-    out body;
-    """
-    response = requests.get(overpass_url, params={"data": query})
-    
-    if response.status_code != 200:
+def fetch_overpass(query):
+    try:
+        return get_json(OVERPASS_URL, params={"data": query})
+    except UpstreamError as e:
+        print(f"Overpass request failed: {e}")
         return None
 
-    land_use_types = set()
-    for element in response.json().get("elements", []):
-        if "tags" in element and "landuse" in element["tags"]:
-            land_use_types.add(element["tags"]["landuse"])
-
-    return land_use_types
+@timed("overpass_wind_context")
+@single_flight(lambda lat, lon, radius=5000: ("overpass", *quantize(lat, lon), radius))
+def fetch_osm_wind_context(lat, lon, radius=5000):
+    """Runs the landuse, infrastructure and turbine checks as one Overpass query.
 
-def fetch_osm_infrastructure(lat, lon, radius=5000):
-    overpass_url = "https://overpass-api.de/api/interpreter"
+    Landuse ways are returned with `out tags` only and the other two sets with
+    `out count`, so no geometry is downloaded. Returns
+    (land_use_types, infra_count, wind_turbines), or (None, None, None) on failure.
+    """
     query = f"""
     [out:json];
+    way(around:{radius},{lat},{lon})["landuse"]->.landuse;
     (
         way(around:{radius},{lat},{lon})["highway"];
         way(around:{radius},{lat},{lon})["power"];
-        way(around:{radius},{lat},{lon})["power"="line"];
-    );
-    out body;
+    )->.infra;
+    node(around:{radius},{lat},{lon})["power"="generator"]["generator:source"="wind"]->.turbines;
+    .landuse out tags;
+    .infra out count;
+    .turbines out count;
     """
-    response = requests.get(overpass_url, params={"data": query})
-    
-    if response.status_code != 200:
-        return None
+    data = fetch_overpass(query)
+    if data is None:
+        return None, None, None
 
-    return len(response.json().get("elements", []))
+    return parse_osm_wind_context(data)
 
-def fetch_existing_wind_turbines(lat, lon, radius=5000):
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    query = f"""
-    [out:json];
-    node(around:{radius},{lat},{lon})["power"="generator"]["generator:source"="wind"];
-    out body;
-    """
-    response = requests.get(overpass_url, params={"data": query})
+def parse_osm_wind_context(data):
+    land_use_types = set()
+    counts = []
+    for element in data.get("elements", []):
+        tags = element.get("tags", {})
+        if element.get("type") == "count":
+            counts.append(int(tags.get("total", 0)))
+        elif "landuse" in tags:
+            land_use_types.add(tags["landuse"])
+
+    # `out count` elements come back in the order the sets were printed
+    infra_count, wind_turbines = (counts + [None, None])[:2]
+    return land_use_types, infra_count, wind_turbines
+
+def evaluate_wind_farm(avg_wind_speed, land_use_types, infra_count, wind_turbines):
+    if wind_turbines and wind_turbines > 0:
+        return {
+            "status": "exists",
+            "message": f"Wind farm already exists with {wind_turbines} turbines."
+        }
 
-    if response.status_code != 200:
-        return None
+    if avg_wind_speed < 3.5:
+        return {
+            "status": "Not Feasible",
+            "message": "Wind speed too low for a wind farm.",
+            "avg_wind_speed": avg_wind_speed
+        }
 
-    return len(response.json().get("elements", []))
+    unsuitable_land = {"residential", "industrial", "urban"}
+    if land_use_types and land_use_types.intersection(unsuitable_land):
+        return {
+            "status": "Not Feasible",
+            "message": f"Land is {land_use_types} → Not suitable for wind farms."
+        }
+
+    if infra_count is None or infra_count < 5:
+        return {
+            "status": "Not Feasible",
+            "message": "No roads or power grid nearby → Wind farm not feasible."
+        }
+
+    turbine_type = "VAWT (Vertical Axis Wind Turbine)" if avg_wind_speed < 6.5 else "HAWT (Horizontal Axis Wind Turbine)"
+
+    return {
+        "status": "feasible",
+        "message": "Wind farm feasible!",
+        "avg_wind_speed": f"{round(avg_wind_speed, 2)} m/s",
+        "recommended_turbine": turbine_type
+    }
 
 def determine_wind_farm(lat, lon):
     wind_df = fetch_nasa_wind_data(lat, lon)
@@ -84,13 +115,9 @@ def determine_wind_farm(lat, lon):
 
     avg_wind_speed = wind_df['WindSpeed'].mean()
 
-    land_use_types = fetch_osm_landuse(lat, lon)
-
-    infra_count = fetch_osm_infrastructure(lat, lon)
-
-    wind_turbines = fetch_existing_wind_turbines(lat, lon)
+    land_use_types, infra_count, wind_turbines = fetch_osm_wind_context(lat, lon)
 
-    if wind_turbines > 0:
+    if wind_turbines and wind_turbines > 0:
         return f"✅ Wind farm already exists! Detected {wind_turbines} wind turbines."
 
     if avg_wind_speed < 3.5:
@@ -100,7 +127,7 @@ def determine_wind_farm(lat, lon):
     if land_use_types and land_use_types.intersection(unsuitable_land):
         return f"❌ Land is {land_use_types} → Not suitable for wind farms."
 
-    if infra_count < 5:
+    if infra_count is None or infra_count < 5:
         return "❌ No roads or power grid nearby → Wind farm not feasible."
 
     if avg_wind_speed < 6.5: